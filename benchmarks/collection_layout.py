@@ -0,0 +1,91 @@
+# python -m benchmarks.collection_layout [--sizes 8000 3000 800 150] [--queries 200]
+# Сравнение раскладок индекса для поиска с фильтром по категории:
+# одна коллекция + where={'category': ...} против отдельной коллекции на категорию.
+# Векторы синтетические, поэтому модель эмбеддингов не нужна.
+import argparse
+import json
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+CATEGORIES = ['мясные продукты', 'молочные продукты', 'вода питьевая', 'водка', 'мясо птицы']
+
+
+def synthetic_corpus(sizes: list[int], dim: int, seed: int = 0):
+    """Векторы категорий: общие «темы» плюс смещение категории, нормированные."""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(32, dim))
+    corpus = {}
+    for category, size in zip(CATEGORIES, sizes):
+        offset = rng.normal(size=dim) * 0.5
+        vectors = topics[rng.integers(0, len(topics), size)] + offset + rng.normal(size=(size, dim)) * 0.8
+        corpus[category] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return corpus, topics
+
+
+def add(collection, vectors: np.ndarray, category: str, batch: int = 4000):
+    for start in range(0, len(vectors), batch):
+        part = vectors[start:start + batch]
+        collection.add(
+            ids=[f'{category}_{start + i}' for i in range(len(part))],
+            embeddings=part.tolist(),
+            metadatas=[{'category': category}] * len(part),
+        )
+
+
+def recall_at_k(found: list[str], expected: list[str]) -> float:
+    return len(set(found) & set(expected)) / len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8000, 3000, 800, 150, 1500])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus, topics = synthetic_corpus(args.sizes, args.dim)
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp())
+
+    single = client.create_collection('docs', metadata={'hnsw:space': 'cosine'})
+    per_category = {}
+    for i, (category, vectors) in enumerate(corpus.items()):
+        add(single, vectors, category)
+        per_category[category] = client.create_collection(f'docs-{i}', metadata={'hnsw:space': 'cosine'})
+        add(per_category[category], vectors, category)
+
+    rng = np.random.default_rng(1)
+    report = {}
+    for category, vectors in corpus.items():
+        queries = vectors[rng.integers(0, len(vectors), args.queries)] + rng.normal(size=(args.queries, args.dim)) * 0.3
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+        expected = [[f'{category}_{j}' for j in row] for row in exact]
+
+        stats = {}
+        for layout, search in (
+            ('single', lambda q: single.query(query_embeddings=[q], n_results=args.k, where={'category': category})),
+            ('per_category', lambda q: per_category[category].query(query_embeddings=[q], n_results=args.k)),
+        ):
+            latencies, recalls = [], []
+            for query, truth in zip(queries.tolist(), expected):
+                start = time.perf_counter()
+                found = search(query)['ids'][0]
+                latencies.append(time.perf_counter() - start)
+                recalls.append(recall_at_k(found, truth))
+            ms = np.array(latencies) * 1000
+            stats[layout] = {
+                'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                'p99_ms': round(float(np.percentile(ms, 99)), 3),
+                f'recall@{args.k}': round(float(np.mean(recalls)), 4),
+            }
+        report[f'{category} ({len(vectors)})'] = stats
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Заменители моделей для офлайн-бенчмарков: эмбеддинги, токенайзер, NLI и LLM
+# без загрузки весов и без сети. Результаты детерминированы.
+import asyncio
+import hashlib
+import math
+import re
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD = re.compile(r'\w+')
+
+
+class HashingEmbeddings(Embeddings):
+    """Мешок слов, хэшированный в dim измерений, с L2-нормировкой."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            vector[int.from_bytes(digest, 'little') % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def offline_tokenizer():
+    """Fast-токенайзер по словам и знакам препинания с [CLS]/[SEP], как у BERT-подобных моделей."""
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(models.WordLevel({'[UNK]': 0, '[CLS]': 1, '[SEP]': 2, '[PAD]': 3}, unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single='[CLS] $A [SEP]', pair='[CLS] $A [SEP] $B [SEP]', special_tokens=[('[CLS]', 1), ('[SEP]', 2)],
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token='[UNK]', cls_token='[CLS]', sep_token='[SEP]', pad_token='[PAD]',
+    )
+
+
+class FakeNLI:
+    """Замена zero-shot pipeline: «одно предложение», если premise не заканчивается концом предложения.
+
+    cost_ms — имитация времени forward pass на один батч. premise_limit — premise
+    длиннее стольких символов считается отдельным предложением, чтобы ответ зависел
+    от всего накопленного premise, как у настоящей модели. calls — число forward pass,
+    pairs — число оценённых пар.
+    """
+
+    def __init__(self, cost_ms: float = 0.0, premise_limit: int | None = None):
+        self.cost = cost_ms / 1000
+        self.premise_limit = premise_limit
+        self.calls = 0
+        self.pairs = 0
+
+    def _classify(self, text: str, labels: list[str]) -> dict:
+        premise = text.split('\n\n', 1)[0].rstrip()
+        same = not premise.endswith(('.', '!', '?'))
+        if self.premise_limit is not None and len(premise) > self.premise_limit:
+            same = False
+        return {'sequence': text, 'labels': list(labels), 'scores': [0.9, 0.1] if same else [0.1, 0.9]}
+
+    def __call__(self, inputs, candidate_labels, multi_label=False, batch_size=None):
+        if isinstance(inputs, str):
+            time.sleep(self.cost)
+            self.calls += 1
+            self.pairs += 1
+            return self._classify(inputs, candidate_labels)
+        batches = math.ceil(len(inputs) / (batch_size or 1))
+        time.sleep(self.cost * batches)
+        self.calls += batches
+        self.pairs += len(inputs)
+        return [self._classify(text, candidate_labels) for text in inputs]
+
+
+@contextmanager
+def offline_models(nli_cost_ms: float = 0.0):
+    """Подмена токенайзера и NLI-модели (построение базы и упаковка контекста) на офлайн-заменители."""
+    from src.client import context_packing
+    from src.create_database import chroma_pdf, semantic_chunking
+
+    tokenizer, nli = offline_tokenizer(), FakeNLI(nli_cost_ms)
+    with mock.patch.object(semantic_chunking, 'get_tokenizer', lambda: tokenizer), \
+            mock.patch.object(chroma_pdf, 'get_tokenizer', lambda: tokenizer), \
+            mock.patch.object(context_packing, 'get_tokenizer', lambda: tokenizer), \
+            mock.patch.object(semantic_chunking, 'get_nli_model', lambda: nli):
+        yield tokenizer, nli
+
+
+class FakeStreamingLLM:
+    """Потоковый «провайдер»: первый токен через ttft_ms, далее по токену раз в token_ms."""
+
+    provider = 'fake'
+
+    def __init__(self, ttft_ms: float = 50.0, token_ms: float = 5.0, tokens: int = 64):
+        self.ttft = ttft_ms / 1000
+        self.interval = token_ms / 1000
+        self.tokens = tokens
+        self.calls = 0
+
+    async def astream_response(self, formatted_context: str, query: str):
+        self.calls += 1
+        await asyncio.sleep(self.ttft)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.interval)
+            yield f'токен{i} '
+
+
+class FakeRegistry:
+    def __init__(self, llm: FakeStreamingLLM):
+        self.llm = llm
+
+    def get(self, provider: str):
+        return self.llm
@@ -0,0 +1,130 @@
+# python -m benchmarks.lexical [--docs 4] [--pages 8] [--embeddings fake|torch|onnx-int8]
+# Лексический индекс BM25 против чисто векторного поиска на синтетических ГОСТах:
+# доля запросов, у которых в top-k есть фрагмент с искомым обозначением стандарта
+# или всеми словами термина (hit rate), и задержка search_document (p50/p95)
+# для запросов-обозначений, запросов-терминов и обычных вопросов.
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import offline_models
+from benchmarks.offline import CATEGORIES, _ingest, make_embeddings, quiet_logs, rounded
+from benchmarks.search_load import QUERIES
+from benchmarks.synthetic_pdf import generate_corpus
+
+# Термины и реактивы из текста синтетических ГОСТов (benchmarks.synthetic_pdf).
+TERM_QUERIES = [
+    'гидроокиси натрия', 'кислой фосфатазы', 'поваренной соли', 'мутность воды', 'коническую колбу',
+    'дистиллированной воде', 'этилового спирта', 'упаковочной единицы', 'наименование показателя',
+    'отбор проб', 'цветность воды', 'нитратов',
+]
+
+
+def identifier_queries(index, n: int, seed: int) -> list[str]:
+    """Запросы вида «ГОСТ 6709» по обозначениям, встречающимся в базе."""
+    found = sorted(term for term in index.vocabulary.tolist() if ' ' in term)
+    return [term.upper() for term in random.Random(seed).sample(found, min(n, len(found)))]
+
+
+def is_hit(query: str, texts: list[str]) -> bool:
+    from src.client.lexical_index import identifiers, indexed_identifiers, terms
+
+    wanted = identifiers(query)
+    if wanted:
+        return any(wanted <= indexed_identifiers(text) for text in texts)
+    wanted = set(terms(query))
+    return any(wanted <= set(terms(text)) for text in texts)
+
+
+async def run_queries(db, queries: list[str], k: int, judge: bool) -> dict:
+    latencies, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        results = await db.search_document(query, with_score=True, k=k)
+        latencies.append(time.perf_counter() - start)
+        hits += judge and is_hit(query, [doc.page_content for doc, _ in results])
+
+    ms = np.array(latencies) * 1000
+    stats = {'queries': len(queries), 'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95))}
+    if judge:
+        stats['hit_rate'] = hits / len(queries)
+    return rounded(stats)
+
+
+async def bench_search(chroma_path: str, embeddings, args) -> dict:
+    from src.client.chroma_db import ChromaDatabase
+    from src.client.lexical_index import lexical_index_path
+    from src.config import settings
+
+    settings.CHROMA_PATH = chroma_path
+    settings.QUERY_CACHE_SIZE = 0
+    settings.QUERY_CACHE_PATH = None
+    settings.SEARCH_MODE = 'hybrid'
+
+    db = ChromaDatabase()
+    await db.init(embeddings=embeddings)
+    lexical = db.lexical
+    workload = {
+        'identifier': (identifier_queries(lexical, args.queries, args.seed), True),
+        'term': (TERM_QUERIES, True),
+        'question': (QUERIES, False),
+    }
+
+    report = {'index': rounded({
+        'chunks': len(lexical),
+        'terms': len(lexical.vocabulary),
+        'size_kb': os.path.getsize(lexical_index_path()) / 1024,
+    })}
+    for mode in ('dense', 'hybrid'):
+        db.lexical = lexical if mode == 'hybrid' else None
+        for queries, _ in workload.values():
+            await run_queries(db, queries, args.k, judge=False)  # прогрев
+        db.lexical_stats = {'identifier': 0, 'hybrid': 0}
+        report[mode] = {
+            name: await run_queries(db, queries, args.k, judge)
+            for name, (queries, judge) in workload.items()
+        }
+        if mode == 'hybrid':
+            report[mode]['routing'] = dict(db.lexical_stats)
+
+    await db.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Лексический индекс BM25 против векторного поиска")
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--docs', type=int, default=4, help="PDF на категорию")
+    parser.add_argument('--pages', type=int, default=8, help="Страниц в PDF")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--embeddings', choices=['fake', 'torch', 'onnx-int8'], default='fake')
+    parser.add_argument('--queries', type=int, default=30, help="Запросов-обозначений")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--output', help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    quiet_logs()
+    with tempfile.TemporaryDirectory(prefix='bench-lexical-') as workdir:
+        pdf_dir = os.path.join(workdir, 'pdf')
+        generate_corpus(pdf_dir, CATEGORIES[:args.categories], args.docs, args.pages, seed=args.seed)
+        chroma_path = os.path.join(workdir, 'chroma')
+        ingest = _ingest(pdf_dir, chroma_path, args.embeddings, 0.0)
+
+        with offline_models():
+            report = asyncio.run(bench_search(chroma_path, make_embeddings(args.embeddings), args))
+        report['ingest'] = ingest
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# python -m benchmarks.offline [--docs 4] [--pages 8] [--output bench.json] [--baseline old.json]
+# Воспроизводимый офлайн-бенчмарк построения базы и поиска на синтетических ГОСТах:
+# извлечение текста (страниц/с), разбиение и объединение фрагментов (фрагментов/с),
+# эмбеддинги (текстов/с), generate_chroma_db целиком (время, пиковый RSS процесса сборки
+# и, отдельно, самого большого воркера извлечения),
+# search_document и /ask_with_ai с фиктивным потоковым LLM (p50/p95/p99).
+# Модели по умолчанию заменены детерминированными заменителями (benchmarks.fakes),
+# поэтому сеть и веса не нужны; --embeddings torch|onnx-int8 включает настоящую модель.
+# С --baseline результаты сравниваются с прошлым прогоном, код возврата 1 при регрессии.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+
+from benchmarks.fakes import FakeRegistry, FakeStreamingLLM, HashingEmbeddings, offline_models
+from benchmarks.search_load import QUERIES, run_load
+from benchmarks.synthetic_pdf import generate_corpus
+
+CATEGORIES = ['мясные продукты', 'молочные продукты', 'вода питьевая', 'водка', 'мясо птицы']
+
+# Направление метрик для сравнения с базовым прогоном (по окончанию ключа).
+HIGHER_IS_BETTER = ('_per_s', 'throughput_rps')
+LOWER_IS_BETTER = ('_ms', 'seconds', '_mb')
+
+
+def quiet_logs():
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+
+def make_embeddings(kind: str):
+    if kind == 'fake':
+        return HashingEmbeddings()
+    from src.client.embeddings import create_embeddings
+
+    return create_embeddings(kind)
+
+
+def rounded(stats: dict) -> dict:
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+
+
+def bench_extraction(paths: list[str]) -> tuple[dict, list[str]]:
+    """process_pdf без кэша извлечения, последовательно: скорость самого разбора."""
+    from src.config import settings
+    from src.create_database.pdf_processing import count_pages, process_pdf
+
+    settings.EXTRACTION_CACHE_ENABLED = False
+    pages = sum(count_pages(path) for path in paths)
+    start = time.perf_counter()
+    texts = [process_pdf(path) for path in paths]
+    seconds = time.perf_counter() - start
+    return rounded({'pages': pages, 'seconds': seconds, 'pages_per_s': pages / seconds}), texts
+
+
+def bench_chunking(texts: list[str], nli_cost_ms: float) -> tuple[dict, list[str]]:
+    """split_by_tokens и merge_docs (NLI пачками по settings.NLI_BATCH_SIZE)."""
+    from langchain_core.documents import Document
+
+    from src.config import settings
+    from src.create_database.semantic_chunking import merge_docs
+    from src.create_database.token_chunking import split_by_tokens
+
+    with offline_models(nli_cost_ms) as (tokenizer, nli):
+        start = time.perf_counter()
+        raw = [
+            [Document(page_content=chunk, metadata={'tokens': tokens})
+             for chunk, tokens in split_by_tokens(text, tokenizer, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)]
+            for text in texts
+        ]
+        split_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        merged = [merge_docs(chunks, nli_model=nli, batch_size=settings.NLI_BATCH_SIZE) for chunks in raw]
+        merge_seconds = time.perf_counter() - start
+
+    n_raw = sum(len(chunks) for chunks in raw)
+    stats = {
+        'raw_chunks': n_raw,
+        'merged_chunks': sum(len(chunks) for chunks in merged),
+        'split_chunks_per_s': n_raw / split_seconds,
+        'merge_chunks_per_s': n_raw / merge_seconds,
+    }
+    return rounded(stats), [doc.page_content for chunks in merged for doc in chunks]
+
+
+def bench_embeddings(embeddings, texts: list[str], batch_size: int = 32) -> dict:
+    embeddings.embed_documents(texts[:batch_size])  # прогрев
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    seconds = time.perf_counter() - start
+    return rounded({'texts': len(texts), 'texts_per_s': len(texts) / seconds})
+
+
+def _ingest(pdf_dir: str, chroma_path: str, embeddings_kind: str, nli_cost_ms: float) -> dict:
+    """generate_chroma_db в отдельном процессе, чтобы пиковый RSS относился только к нему."""
+    quiet_logs()
+    from src.config import settings
+    from src.create_database.chroma_pdf import generate_chroma_db, peak_rss_mb
+
+    settings.CHROMA_PATH = chroma_path
+    settings.EXTRACTION_CACHE_ENABLED = False
+    embeddings = make_embeddings(embeddings_kind)
+    with offline_models(nli_cost_ms):
+        start = time.perf_counter()
+        stores = generate_chroma_db(
+            pdf_dir, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, full=True, embeddings=embeddings,
+        )
+        seconds = time.perf_counter() - start
+    chunks = sum(store._collection.count() for store in stores.existing())
+    main_rss, worker_rss = peak_rss_mb()
+    return rounded({'seconds': seconds, 'peak_rss_mb': main_rss, 'worker_peak_rss_mb': worker_rss, 'chunks': chunks})
+
+
+def bench_ingest(pdf_dir: str, chroma_path: str, embeddings_kind: str, nli_cost_ms: float) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_ingest, pdf_dir, chroma_path, embeddings_kind, nli_cost_ms).result()
+
+
+async def bench_serving(chroma_path: str, embeddings, args) -> dict:
+    """search_document и /ask_with_ai (с фиктивным LLM) при разной конкурентности."""
+    import httpx
+    from fastapi import FastAPI
+
+    from src.api.router import router
+    from src.client.cache import AnswerCache, get_answer_cache
+    from src.client.chroma_db import ChromaDatabase, get_chroma_database
+    from src.client.llm_registry import get_llm_registry
+    from src.config import settings
+
+    settings.CHROMA_PATH = chroma_path
+    # Кэши отключены: замеряется эмбеддинг запроса, поиск HNSW и поток ответа, а не попадания в кэш.
+    settings.QUERY_CACHE_SIZE = 0
+    settings.QUERY_CACHE_PATH = None
+
+    db = ChromaDatabase()
+    await db.init(embeddings=embeddings)
+    llm = FakeStreamingLLM(args.llm_ttft_ms, args.llm_token_ms, args.llm_tokens)
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides.update({
+        get_chroma_database: lambda: db,
+        get_llm_registry: lambda: FakeRegistry(llm),
+        get_answer_cache: lambda: AnswerCache(max_size=0, ttl=0),
+    })
+
+    search = lambda query: db.search_document(query, with_score=True, k=5)
+    await run_load(search, QUERIES, 1, len(QUERIES))  # прогрев
+
+    results = {'search': {}, 'ask_with_ai': {}}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        async def ask(query: str):
+            response = await client.post('/ask_with_ai', json={'response': query})
+            response.raise_for_status()
+
+        for concurrency in args.concurrency:
+            results['search'][f'c{concurrency}'] = rounded(
+                await run_load(search, QUERIES, concurrency, args.requests))
+            # Уникальные запросы: одинаковые одновременные объединялись бы в один поток.
+            unique = [f'{QUERIES[i % len(QUERIES)]} ({i})' for i in range(args.requests)]
+            results['ask_with_ai'][f'c{concurrency}'] = rounded(
+                await run_load(ask, unique, concurrency, args.requests))
+
+    await db.close()
+    return results
+
+
+def flatten(report: dict, prefix: str = '') -> dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Сравнение с базовым прогоном; возвращает метрики, ухудшившиеся больше чем на tolerance."""
+    regressions = []
+    current, baseline = flatten(current), flatten(baseline)
+    for key in sorted(current.keys() & baseline.keys()):
+        if key.startswith('meta.'):
+            continue
+        higher = key.endswith(HIGHER_IS_BETTER)
+        lower = key.endswith(LOWER_IS_BETTER)
+        if not (higher or lower) or not baseline[key]:
+            continue
+        change = (current[key] - baseline[key]) / baseline[key]
+        worse = -change if higher else change
+        mark = ''
+        if worse > tolerance:
+            mark = '  РЕГРЕССИЯ'
+            regressions.append(key)
+        print(f'{key:45} {baseline[key]:>12} -> {current[key]:>12} ({change:+.1%}){mark}')
+    return regressions
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--docs', type=int, default=4, help="PDF на категорию")
+    parser.add_argument('--pages', type=int, default=8, help="Страниц в PDF")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--embeddings', choices=['fake', 'torch', 'onnx-int8'], default='fake')
+    parser.add_argument('--nli-cost-ms', type=float, default=0.0, help="Имитация forward pass NLI на батч")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--llm-ttft-ms', type=float, default=50.0)
+    parser.add_argument('--llm-token-ms', type=float, default=5.0)
+    parser.add_argument('--llm-tokens', type=int, default=64)
+    parser.add_argument('--workdir', help="Каталог для PDF и базы (по умолчанию временный)")
+    parser.add_argument('--output', help="Файл для результатов в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    quiet_logs()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='rag-bench-')
+    pdf_dir = os.path.join(workdir, 'pdf')
+    generate_corpus(pdf_dir, CATEGORIES[:args.categories], args.docs, args.pages, seed=args.seed)
+    paths = sorted(
+        os.path.join(pdf_dir, category, name)
+        for category in os.listdir(pdf_dir) for name in os.listdir(os.path.join(pdf_dir, category))
+    )
+
+    report = {'meta': {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'args': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'workdir')},
+    }}
+
+    report['extraction'], texts = bench_extraction(paths)
+    print(json.dumps({'extraction': report['extraction']}, ensure_ascii=False))
+    report['chunking'], chunks = bench_chunking(texts, args.nli_cost_ms)
+    print(json.dumps({'chunking': report['chunking']}, ensure_ascii=False))
+
+    embeddings = make_embeddings(args.embeddings)
+    report['embeddings'] = bench_embeddings(embeddings, chunks)
+    print(json.dumps({'embeddings': report['embeddings']}, ensure_ascii=False))
+
+    chroma_path = os.path.join(workdir, 'chroma')
+    report['ingest'] = bench_ingest(pdf_dir, chroma_path, args.embeddings, args.nli_cost_ms)
+    print(json.dumps({'ingest': report['ingest']}, ensure_ascii=False))
+
+    with offline_models(args.nli_cost_ms):
+        report.update(asyncio.run(bench_serving(chroma_path, embeddings, args)))
+    print(json.dumps({key: report[key] for key in ('search', 'ask_with_ai')}, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f'Регрессии: {len(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
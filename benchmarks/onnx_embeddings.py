@@ -0,0 +1,123 @@
+# python -m benchmarks.onnx_embeddings [--k 5] [--repeat 8] [--threads N]
+# Сравнение бэкендов эмбеддингов: fp32 (torch) и int8 (ONNX Runtime).
+# Точность — косинус между векторами одного текста и пересечение top-k
+# поиска по корпусу-фикстуре; скорость — тексты/с в батчах и задержка одного запроса.
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.client.embeddings import create_embeddings
+from src.config import settings
+
+CORPUS = [
+    'Массовая доля белка в мясе категории А должна быть не менее 18 %.',
+    'Массовая доля жира определяется методом Сокслета после высушивания навески.',
+    'Массовая доля углеводов в мясных продуктах рассчитывается по разности.',
+    'Раствор гидроокиси натрия концентрации 330 г/дм3 готовят растворением навески в дистиллированной воде.',
+    'Для определения нитрита натрия используют реактив Грисса.',
+    'Пробы колбасных изделий отбирают по ГОСТ 9792.',
+    'Температура в толще продукта при выпуске с предприятия не должна превышать 8 °С.',
+    'Остаточная активность кислой фосфатазы характеризует степень термической обработки.',
+    'Мясо птицы подразделяют на тушки цыплят, цыплят-бройлеров, кур и индеек.',
+    'Тушки птицы по качеству обработки подразделяют на первый и второй сорт.',
+    'Массовая доля влаги в мясе птицы определяется высушиванием при 103 °С.',
+    'Молоко питьевое пастеризованное хранят при температуре (4 ± 2) °С.',
+    'Кислотность молока определяют титрованием раствором гидроокиси натрия в присутствии фенолфталеина.',
+    'Массовая доля жира в молоке определяется кислотным методом Гербера.',
+    'Плотность молока измеряют ареометром при температуре 20 °С.',
+    'Сыры твёрдые выдерживают при температуре от 10 до 14 °С.',
+    'Вода питьевая должна быть безопасна в эпидемическом и радиационном отношении.',
+    'Организация контроля питьевой воды должна соответствовать ГОСТ 2874 и ГОСТ 2761.',
+    'Мутность воды определяют фотометрическим методом по формазину.',
+    'Цветность воды измеряется в градусах платино-кобальтовой шкалы.',
+    'Жёсткость воды определяют комплексонометрическим титрованием трилоном Б.',
+    'Содержание нитратов в питьевой воде не должно превышать 45 мг/дм3.',
+    'Водка — спиртной напиток крепостью от 40 % до 56 %.',
+    'Объёмная доля этилового спирта определяется ареометром для спирта.',
+    'Массовая концентрация сивушного масла определяется газохроматографическим методом.',
+    'Водку разливают в стеклянные бутылки с укупоркой колпачками.',
+    'Молярная концентрация раствора равна количеству вещества, делённому на объём раствора.',
+    'Массовая доля поваренной соли определяется аргентометрическим методом Мора.',
+    'Отбор проб проводят от каждой партии продукции в соответствии с нормативным документом.',
+    'Результаты испытаний оформляют протоколом с указанием метода и погрешности.',
+    'Погрешность измерений рассчитывают по формуле расширенной неопределённости.',
+    'Показатели безопасности не должны превышать допустимых уровней, установленных техническим регламентом.',
+]
+
+QUERIES = [
+    'Как приготовить раствор гидроокиси натрия концентрации 330 г/дм**3?',
+    'Массовая доля углеводов в мясе категории А',
+    'Организация контроля питьевой воды',
+    'Как определить массовую долю жира в молоке?',
+    'Крепость водки',
+    'Сорта тушек птицы',
+    'Предельное содержание нитратов в воде',
+    'Как рассчитать молярную концентрацию раствора?',
+    'Метод определения жёсткости воды',
+    'Температура хранения молока',
+]
+
+
+def throughput(embeddings, texts: list[str], repeat: int) -> dict:
+    """Тексты/с при пакетном эмбеддинге и задержка одного запроса."""
+    embeddings.embed_documents(texts[:4])  # прогрев
+    batch = texts * repeat
+    start = time.perf_counter()
+    embeddings.embed_documents(batch)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for query in QUERIES * 3:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+    ms = np.array(latencies) * 1000
+    return {
+        'texts_per_s': round(len(batch) / elapsed, 1),
+        'query_p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'query_p95_ms': round(float(np.percentile(ms, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=None, help='ONNX_NUM_THREADS')
+    args = parser.parse_args()
+    if args.threads:
+        settings.ONNX_NUM_THREADS = args.threads
+
+    backends = {name: create_embeddings(name) for name in ('torch', 'onnx-int8')}
+    vectors = {
+        name: (np.array(emb.embed_documents(CORPUS)), np.array(emb.embed_documents(QUERIES)))
+        for name, emb in backends.items()
+    }
+
+    (docs_fp32, queries_fp32), (docs_int8, queries_int8) = vectors['torch'], vectors['onnx-int8']
+    cosine = np.concatenate([
+        (docs_fp32 * docs_int8).sum(axis=1),
+        (queries_fp32 * queries_int8).sum(axis=1),
+    ])
+    top_fp32 = np.argsort(-(queries_fp32 @ docs_fp32.T), axis=1)[:, :args.k]
+    top_int8 = np.argsort(-(queries_int8 @ docs_int8.T), axis=1)[:, :args.k]
+    overlap = [len(set(a) & set(b)) / args.k for a, b in zip(top_fp32.tolist(), top_int8.tolist())]
+    top1 = float(np.mean(top_fp32[:, 0] == top_int8[:, 0]))
+
+    report = {
+        'accuracy': {
+            'cosine_mean': round(float(cosine.mean()), 5),
+            'cosine_min': round(float(cosine.min()), 5),
+            f'overlap@{args.k}': round(float(np.mean(overlap)), 4),
+            'top1_agreement': round(top1, 4),
+        },
+        'throughput': {name: throughput(emb, CORPUS, args.repeat) for name, emb in backends.items()},
+        'onnx_threads': backends['onnx-int8'].num_threads,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# python -m benchmarks.search_load [--concurrency 1 8 32] [--requests 256]
+# Нагрузочный тест ChromaDatabase.search_document: пропускная способность и
+# перцентили задержки при разном числе одновременных запросов.
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+
+import numpy as np
+
+QUERIES = [
+    "Как приготовить раствор гидроокиси натрия концентрации 330 г/дм**3?",
+    "Массовая доля углеводов в мясе категории А",
+    "Определение истинного белка",
+    "массовая доля белка",
+    "Что используется для хранения проб, содержащих светочувствительные материалы?",
+    "При каких условиях хранят емкости с водой в транспортной упаковке?",
+    "объемная доля этанола",
+    "Как приготовить яично-желточно-азидный агар",
+]
+
+
+async def run_load(search: Callable[[str], Awaitable], queries: list[str],
+                   concurrency: int, requests: int) -> dict:
+    """requests вызовов search не более чем по concurrency одновременно."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await search(queries[i % len(queries)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'throughput_rps': requests / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+async def main():
+    from src.client.chroma_db import ChromaDatabase
+    from src.config import settings
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, help="EMBED_BATCH_MAX_SIZE (1 — без батчинга)")
+    args = parser.parse_args()
+
+    if args.batch_size:
+        settings.EMBED_BATCH_MAX_SIZE = args.batch_size
+
+    db = ChromaDatabase()
+    await db.init()
+    search = lambda query: db.search_document(query, with_score=True, k=5)
+    await run_load(search, QUERIES, 1, len(QUERIES))  # прогрев
+
+    for concurrency in args.concurrency:
+        print(json.dumps(await run_load(search, QUERIES, concurrency, args.requests)))
+    await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
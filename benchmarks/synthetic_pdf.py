@@ -0,0 +1,204 @@
+# Генератор синтетических PDF, похожих на ГОСТы: титульная страница, разделы
+# с текстом, повторяющиеся типовые блоки и таблицы с линиями сетки.
+# PDF пишется вручную (без reportlab): простой шрифт Type1 с кодировкой
+# /Differences, отображающей коды 128+ на кириллицу, поэтому pdfplumber
+# извлекает текст так же, как из настоящих документов.
+import os
+import random
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+FONT_SIZE = 10
+CHAR_WIDTH = 0.5 * FONT_SIZE
+LINE_HEIGHT = 14
+LINE_CHARS = int((PAGE_WIDTH - 2 * MARGIN) / CHAR_WIDTH)
+
+EXTRA_CHARS = 'Ёё№°±—«»'
+CHARSET = [chr(c) for c in range(0x410, 0x450)] + list(EXTRA_CHARS)
+ENCODING = {char: 128 + i for i, char in enumerate(CHARSET)}
+
+SUBJECTS = [
+    'Массовая доля белка', 'Массовая доля жира', 'Массовая доля влаги', 'Объемная доля этилового спирта',
+    'Массовая концентрация нитратов', 'Кислотность продукта', 'Температура хранения', 'Масса нетто упаковочной единицы',
+    'Массовая доля поваренной соли', 'Остаточная активность кислой фосфатазы', 'Мутность воды', 'Цветность воды',
+]
+PREDICATES = [
+    'должна быть не менее {n} %', 'не должна превышать {n} мг/дм3', 'определяют по ГОСТ {g}',
+    'устанавливают в соответствии с таблицей {t}', 'контролируют в каждой партии продукции',
+    'рассчитывают по формуле с погрешностью ±{n} %', 'измеряют при температуре ({n} ± 2) °С',
+]
+CLAUSES = [
+    'Отбор проб проводят по ГОСТ {g}.', 'Результаты испытаний оформляют протоколом.',
+    'Допускается применение других средств измерений с аналогичными характеристиками.',
+    'Раствор гидроокиси натрия концентрации {n} г/дм3 готовят растворением навески в дистиллированной воде.',
+    'Для приготовления растворов применяют воду дистиллированную по ГОСТ 6709.',
+    'Навеску продукта массой {n} г помещают в коническую колбу вместимостью 250 см3.',
+]
+BOILERPLATE = [
+    '2 Нормативные ссылки',
+    'В настоящем стандарте использованы нормативные ссылки на следующие межгосударственные стандарты:',
+    'ГОСТ 9792 Колбасные изделия и продукты из свинины, баранины, говядины и мяса других видов убойных '
+    'животных и птиц. Методы отбора проб.',
+    'ГОСТ 6709 Вода дистиллированная. Технические условия.',
+    'ГОСТ 29227 Посуда лабораторная стеклянная. Пипетки градуированные. Часть 1. Общие требования.',
+    'Примечание — При пользовании настоящим стандартом целесообразно проверить действие ссылочных стандартов.',
+]
+TABLE_HEADER = ['Наименование показателя', 'Норма', 'Метод испытания']
+
+
+def _sentence(rnd: random.Random) -> str:
+    values = {'n': rnd.randint(1, 99), 'g': rnd.randint(1000, 34000), 't': rnd.randint(1, 5)}
+    if rnd.random() < 0.3:
+        return rnd.choice(CLAUSES).format(**values)
+    return f'{rnd.choice(SUBJECTS)} {rnd.choice(PREDICATES).format(**values)}.'
+
+
+def _paragraph(rnd: random.Random, sentences: int) -> str:
+    return ' '.join(_sentence(rnd) for _ in range(sentences))
+
+
+def _wrap(text: str) -> list[str]:
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > LINE_CHARS:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _pdf_string(text: str) -> str:
+    out = []
+    for char in text:
+        code = ENCODING.get(char, ord(char) if 32 <= ord(char) < 127 else ord('?'))
+        if char in '\\()':
+            out.append('\\' + char)
+        elif code >= 128:
+            out.append(f'\\{code:03o}')
+        else:
+            out.append(chr(code))
+    return '(' + ''.join(out) + ')'
+
+
+def _text(x: float, y: float, text: str) -> str:
+    return f'BT /F1 {FONT_SIZE} Tf 1 0 0 1 {x:.1f} {y:.1f} Tm {_pdf_string(text)} Tj ET'
+
+
+def _table(rnd: random.Random, top: float, rows: int) -> tuple[list[str], float]:
+    """Таблица с сеткой линий; возвращает команды и нижнюю границу."""
+    widths = [250, 100, 145]
+    row_height = 18
+    ops = ['0.5 w']
+    data = [TABLE_HEADER] + [
+        [rnd.choice(SUBJECTS), f'{rnd.randint(1, 99)},{rnd.randint(0, 9)}', f'ГОСТ {rnd.randint(1000, 34000)}']
+        for _ in range(rows)
+    ]
+    bottom = top - row_height * len(data)
+    x = MARGIN
+    for width in [0, *widths]:
+        x += width
+        ops.append(f'{x:.1f} {top:.1f} m {x:.1f} {bottom:.1f} l S')
+    for i in range(len(data) + 1):
+        y = top - i * row_height
+        ops.append(f'{MARGIN:.1f} {y:.1f} m {MARGIN + sum(widths):.1f} {y:.1f} l S')
+    for i, row in enumerate(data):
+        y = top - (i + 1) * row_height + 5
+        x = MARGIN
+        for width, cell in zip(widths, row):
+            ops.append(_text(x + 3, y, cell[: int((width - 6) / CHAR_WIDTH)]))
+            x += width
+    return ops, bottom
+
+
+def _pages(rnd: random.Random, gost: str, n_pages: int) -> list[list[str]]:
+    pages = [[
+        _text(MARGIN, 760, 'МЕЖГОСУДАРСТВЕННЫЙ СТАНДАРТ'),
+        _text(MARGIN, 730, gost),
+        _text(MARGIN, 700, 'Методы испытаний'),
+        _text(MARGIN, 120, 'Издание официальное'),
+    ]]
+
+    blocks = [('text', line) for text in BOILERPLATE for line in _wrap(text)]
+    section = 3
+    while len(pages) < n_pages:
+        ops, y = [], PAGE_HEIGHT - MARGIN
+        ops.append(_text(PAGE_WIDTH - MARGIN - CHAR_WIDTH * len(gost), y, gost))
+        y -= 2 * LINE_HEIGHT
+        while y > MARGIN + LINE_HEIGHT:
+            if not blocks:
+                blocks.append(('text', f'{section} {rnd.choice(SUBJECTS)}'))
+                for _ in range(rnd.randint(2, 4)):
+                    blocks.extend(('text', line) for line in _wrap(_paragraph(rnd, rnd.randint(3, 7))))
+                if rnd.random() < 0.5:
+                    blocks.append(('table', rnd.randint(3, 8)))
+                section += 1
+
+            kind, value = blocks[0]
+            if kind == 'table':
+                if y - 18 * (value + 1) < MARGIN:
+                    break
+                table_ops, y = _table(rnd, y, value)
+                ops.extend(table_ops)
+                y -= LINE_HEIGHT
+            else:
+                ops.append(_text(MARGIN, y, value))
+                y -= LINE_HEIGHT
+            blocks.pop(0)
+        pages.append(ops)
+    return pages
+
+
+def write_gost_pdf(path: str, n_pages: int, seed: int = 0):
+    """Синтетический ГОСТ из n_pages страниц (первая — титульная)."""
+    rnd = random.Random(seed)
+    gost = f'ГОСТ {rnd.randint(1000, 34000)}—{rnd.randint(1990, 2024)}'
+    pages = _pages(rnd, gost, max(n_pages, 2))
+
+    differences = ' '.join(f'/uni{ord(char):04X}' for char in CHARSET)
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # Pages — после страниц
+        '<< /Type /Font /Subtype /Type1 /BaseFont /GostSans /FirstChar 32 /LastChar 255 '
+        f'/Widths [{" ".join(["500"] * 224)}] '
+        f'/Encoding << /Type /Encoding /Differences [128 {differences}] >> /FontDescriptor 4 0 R >>',
+        '<< /Type /FontDescriptor /FontName /GostSans /Flags 32 /FontBBox [0 -200 1000 900] '
+        '/ItalicAngle 0 /Ascent 800 /Descent -200 /CapHeight 700 /StemV 80 >>',
+    ]
+    page_ids = []
+    for ops in pages:
+        stream = '\n'.join(ops)
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>'
+        )
+        page_ids.append(len(objects))
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(f"{i} 0 R" for i in page_ids)}] /Count {len(page_ids)} >>'
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{i} 0 obj\n{body}\nendobj\n'.encode('ascii')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('ascii')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii')
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_corpus(root: str, categories: list[str], docs_per_category: int, pages: int, seed: int = 0) -> int:
+    """Папки категорий с синтетическими PDF, как ожидает generate_chroma_db. Возвращает число страниц."""
+    total = 0
+    for c, category in enumerate(categories):
+        folder = os.path.join(root, category)
+        os.makedirs(folder, exist_ok=True)
+        for d in range(docs_per_category):
+            write_gost_pdf(os.path.join(folder, f'gost_{c}_{d}.pdf'), pages, seed=seed * 1000 + c * 100 + d)
+            total += pages
+    return total
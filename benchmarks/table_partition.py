@@ -0,0 +1,94 @@
+# python -m benchmarks.table_partition [--pdf file.pdf --page 12]
+# Сравнение разбора символов таблиц: прежний вариант (фильтр страницы на каждую
+# таблицу, O(таблицы × объекты)) против replace_table_chars (один векторный проход).
+import argparse
+import random
+import time
+
+import pdfplumber
+from pdfplumber.utils import crop_to_bbox, extract_text, get_bbox_overlap, obj_to_bbox
+
+from src.create_database.pdf_processing import replace_table_chars
+
+
+def reference_table_chars(chars: list[dict], tables: list[tuple[tuple, str]]) -> list[dict]:
+    """Прежняя логика process_pdf: повторная фильтрация и crop на каждую таблицу."""
+    filtered = chars
+    for bbox, markdown in tables:
+        filtered = [obj for obj in filtered if get_bbox_overlap(obj_to_bbox(obj), bbox) is None]
+        first_table_char = crop_to_bbox(chars, bbox)[0]
+        filtered.append({**first_table_char, "text": markdown})
+    return filtered
+
+
+def synthetic_page(n_tables: int = 12, rows: int = 70, cols: int = 90, seed: int = 0):
+    """Страница-приложение ГОСТа: сетка символов и n_tables таблиц друг под другом."""
+    rnd = random.Random(seed)
+    chars = []
+    for row in range(rows):
+        top = 20 + row * 11
+        for col in range(cols):
+            x0 = 20 + col * 6
+            chars.append({
+                'text': rnd.choice('абвгдежзиклмнопрст0123456789 '),
+                'fontname': 'Times', 'size': 10.0, 'upright': True,
+                'x0': x0, 'x1': x0 + 5.5, 'top': top, 'bottom': top + 10,
+                'doctop': top, 'width': 5.5, 'height': 10.0,
+                'matrix': (1, 0, 0, 1, x0, 800 - top - 10), 'adv': 5.5,
+                'stroking_color': None, 'non_stroking_color': None,
+            })
+    band = rows * 11 // n_tables
+    tables = []
+    for i in range(n_tables):
+        top = 20 + i * band + 5
+        bbox = (60.0, float(top), 500.0, float(top + band - 15))
+        tables.append((bbox, f'| Показатель | Значение |\n|---|---|\n| таблица {i} | {i} |'))
+    return chars, tables
+
+
+def real_page(pdf_path: str, page_index: int):
+    with pdfplumber.open(pdf_path) as pdf:
+        page = pdf.pages[page_index]
+        page = page.crop(page.bbox)
+        tables = [(table.bbox, f'таблица {i}') for i, table in enumerate(page.find_tables())]
+        return page.chars, tables
+
+
+def timeit(fn, *args, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf', help="PDF со страницей, богатой таблицами")
+    parser.add_argument('--page', type=int, default=0)
+    parser.add_argument('--tables', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pdf:
+        chars, tables = real_page(args.pdf, args.page)
+    else:
+        chars, tables = synthetic_page(args.tables)
+
+    old = reference_table_chars(chars, tables)
+    new = replace_table_chars(chars, tables)
+    identical = old == new and extract_text(old, layout=True) == extract_text(new, layout=True)
+
+    old_time = timeit(reference_table_chars, chars, tables, repeat=args.repeat)
+    new_time = timeit(replace_table_chars, chars, tables, repeat=args.repeat)
+
+    print(f'символов: {len(chars)}, таблиц: {len(tables)}')
+    print(f'прежний вариант: {old_time * 1000:.2f} мс')
+    print(f'один проход:     {new_time * 1000:.2f} мс')
+    print(f'ускорение:       {old_time / new_time:.1f}x')
+    print(f'вывод идентичен: {identical}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,157 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 
-from src.api.schemas import AskWithAIResponse
-from src.client.ai_chat import ChatWithAI
+from src.api.schemas import AskBatchRequest, AskWithAIResponse
+from src.client.ai_chat import ERROR_MESSAGE
+from src.client.cache import AnswerCache, context_fingerprint, get_answer_cache
 from src.client.chroma_db import ChromaDatabase, get_chroma_database
+from src.client.coalescing import (
+    SingleFlight, StreamCoalescer, get_answer_streams, get_search_flight,
+)
+from src.client.context_packing import pack_context
+from src.client.llm_registry import LLMRegistry, ProviderUnavailable, get_llm_registry
+from src.client.normalization import normalize_query
+from src.config import settings
+from src.metrics import metrics
 
 
 router = APIRouter()
 
+
+def format_results(results) -> list[dict]:
+    formatted_results = []
+
+    for doc, score in results:
+
+        formatted_results.append(
+            {
+                'text': doc.page_content,
+                'metadata': doc.metadata,
+                'similarity_score': score,
+            }
+        )
+    return formatted_results
+
+
+async def coalesced_search(
+    vectorstore: ChromaDatabase, search_flight: SingleFlight,
+    query: str, category: str | None, k: int = 5,
+):
+    """Поиск, общий для одинаковых одновременных запросов (нормализованный запрос, категория, k)."""
+    filter = {'category': category} if category else None
+    with metrics.span('retrieval'):
+        return await search_flight.do(
+            (normalize_query(query), category, k),
+            lambda: vectorstore.search_document(query=query, filter=filter, with_score=True, k=k),
+        )
+
+
 @router.post('/ask')
 async def ask(
     request: AskWithAIResponse,
     vectorstore: ChromaDatabase = Depends(get_chroma_database),
+    search_flight: SingleFlight = Depends(get_search_flight),
 ):
     
     query  = request.response
     category = request.category
 
-    filter = {'category': category} if category else None
+    results = await coalesced_search(vectorstore, search_flight, query, category, k=5)
 
-    results = await vectorstore.search_document(
-        query  = query, filter = filter, with_score = True, k=5, 
-    )
+    return {'results': format_results(results)}
 
-    formatted_results = []
 
-    for doc, score in results:
+@router.post('/ask_batch')
+async def ask_batch(
+    request: AskBatchRequest,
+    vectorstore: ChromaDatabase = Depends(get_chroma_database),
+):
+    """Поиск сразу по списку запросов; результаты в порядке запросов."""
+    queries = [item.response for item in request.items]
+    filters = [{'category': item.category} if item.category else None for item in request.items]
 
-        formatted_results.append(
-            {
-                'text': doc.page_content,
-                'metadata': doc.metadata,
-                'similarity_score': score,
-            }
-        )
-    return {'results': formatted_results}
+    results = await vectorstore.search_batch(queries, filters, k=5)
+
+    return {'results': [format_results(result) for result in results]}
+
+
+@router.post('/ask_batch/stream')
+async def ask_batch_stream(
+    request: AskBatchRequest,
+    vectorstore: ChromaDatabase = Depends(get_chroma_database),
+):
+    """Пакетный поиск в формате NDJSON: строка {"index", "results"} по мере готовности."""
+    queries = [item.response for item in request.items]
+    filters = [{'category': item.category} if item.category else None for item in request.items]
+
+    async def stream_results():
+        async for i, result in vectorstore.iter_search_batch(queries, filters, k=5):
+            yield json.dumps({'index': i, 'results': format_results(result)}, ensure_ascii=False) + '\n'
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 
 @router.post("/ask_with_ai")
 async def ask_with_ai(
     request: AskWithAIResponse,
     vectorstore: ChromaDatabase = Depends(get_chroma_database),
+    answer_cache: AnswerCache = Depends(get_answer_cache),
+    llm_registry: LLMRegistry = Depends(get_llm_registry),
+    search_flight: SingleFlight = Depends(get_search_flight),
+    answer_streams: StreamCoalescer = Depends(get_answer_streams),
 ):
     category  = request.category
     query = request.response
+    provider = request.provider or 'deepseek'
+    try:
+        ai_store = llm_registry.get(provider)
+    except ProviderUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    filter = {'category': category} if category else None
-    results = await vectorstore.search_document(
-    query  = query, filter = filter, with_score = True, k=5, 
-    )
-    if results:
-        ai_context = "\n".join([doc.page_content for doc, _ in results])
-        ai_store = ChatWithAI()  
-
-        async def stream_response():
+    results = await coalesced_search(vectorstore, search_flight, query, category, k=5)
+    with metrics.span('context_assembly'):
+        # Токенизация блокирует, поэтому упаковка идёт в пуле потоков поиска.
+        ai_context = await asyncio.get_running_loop().run_in_executor(
+            vectorstore.executor, pack_context,
+            results, settings.CONTEXT_MAX_TOKENS, settings.CONTEXT_MIN_SIMILARITY,
+        )
+        if ai_context:
+            cache_key = answer_cache.key(
+                query, category, provider, context_fingerprint(results),
+            )
+            cached = answer_cache.get(cache_key)
+
+    if ai_context:
+        async def generate():
+            chunks = []
             async for chunk in ai_store.astream_response(ai_context, query):
+                chunks.append(chunk)
+                yield chunk
+
+            # В кэш попадают только полностью отданные ответы без ошибки. При хеджировании
+            # ответ мог дать запасной провайдер — тогда он кэшируется под его именем,
+            # а не как ответ запрошенного.
+            if chunks and chunks[-1] != ERROR_MESSAGE:
+                answered_by = getattr(ai_store, 'answered_by', None) or provider
+                answer_cache.put(
+                    cache_key if answered_by == provider else answer_cache.key(
+                        query, category, answered_by, context_fingerprint(results),
+                    ),
+                    chunks,
+                )
+
+        async def stream_cached():
+            for chunk in cached:
                 yield chunk
 
+        # Одинаковые одновременные запросы получают один поток LLM на всех.
+        stream = stream_cached() if cached is not None else answer_streams.subscribe(cache_key, generate)
+
         return StreamingResponse(
-            stream_response(),
+            stream,
             media_type="text/plain",
             headers={
                 "Content-Type": "text/plain",
@@ -68,4 +161,18 @@ async def ask_with_ai(
             },
         )
     else:
-        return {"response": "Ничего не найдено"}
\ No newline at end of file
+        return {"response": "Ничего не найдено"}
+
+
+@router.get('/stats')
+async def stats(
+    vectorstore: ChromaDatabase = Depends(get_chroma_database),
+    answer_cache: AnswerCache = Depends(get_answer_cache),
+    search_flight: SingleFlight = Depends(get_search_flight),
+    answer_streams: StreamCoalescer = Depends(get_answer_streams),
+):
+    return {
+        **vectorstore.stats(),
+        'answer_cache': answer_cache.stats(),
+        'coalescing': {'search': search_flight.stats(), 'answer_streams': answer_streams.stats()},
+    }
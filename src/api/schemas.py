@@ -5,4 +5,13 @@ from pydantic import BaseModel
 class AskWithAIResponse(BaseModel):
     response: str
     category: str | None = None
-    provider: Literal["deepseek", "gigachat"] | None = "deepseek"
\ No newline at end of file
+    provider: Literal["deepseek", "gigachat"] | None = "deepseek"
+
+
+class AskBatchItem(BaseModel):
+    response: str
+    category: str | None = None
+
+
+class AskBatchRequest(BaseModel):
+    items: list[AskBatchItem]
@@ -1,60 +1,85 @@
+import asyncio
+from contextlib import nullcontext
+
+import httpx
 from langchain_gigachat import GigaChat
 from langchain_deepseek import ChatDeepSeek
 from typing import AsyncGenerator, Literal
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from src.config import settings
+from src.metrics import metrics
+
+# Ответ, который получает пользователь при ошибке провайдера.
+ERROR_MESSAGE = "Ошибка"
+
+SYSTEM_PROMPT = """
+        Ты — помощник химика. Отвечай кратко, основываясь лишь на переданном контексте. 
+        Если требуется формула — оформляй её в блоке markdown с помощью `$$...$$` для отдельной строки или `$...$` для строки с текстом.
+
+        Пример 1:
+        Вопрос: Организация контроля питьевой воды.
+        Ответ: Организация и проведение производственного контроля должны соответствовать требо­ваниям ГОСТ 2874, ГОСТ 2761 и национальным санитарно-эпидемиологическим правилам и нормам,
+        установленным для предприятий пищевой промышленности, а также включать систему обеспечения и контроля качества.
+
+        Пример 2 (с формулой):
+        Вопрос: Как рассчитать молярную концентрацию раствора?
+        Ответ: Молярная концентрация рассчитывается по формуле:
+        $$ C = \frac{n}{V} $$
+        где $C$ — молярная концентрация (моль/л), $n$ — количество вещества (моль), $V$ — объём раствора (л).
+        """
 
 class ChatWithAI:
-    def __init__(self, provider: Literal['deepseek', 'gigachat'] = 'deepseek'):
+    def __init__(
+            self,
+            provider: Literal['deepseek', 'gigachat'] = 'deepseek',
+            http_async_client: httpx.AsyncClient | None = None,
+            max_concurrent_streams: int | None = None,
+    ):
         self.provider = provider
+        # Ограничение числа одновременных потоков к провайдеру.
+        self._streams = asyncio.Semaphore(max_concurrent_streams) if max_concurrent_streams else nullcontext()
+
         if provider == 'deepseek':
             self.llm = ChatDeepSeek(
                 api_key=settings.DEEPSEEK_API,
                 model=settings.DEEPSEEK,
                 temperature=0.0,
+                http_async_client=http_async_client,
             )
 
         elif provider == 'gigachat':
             self.llm = GigaChat(
                 model = 'Gigachat',
                 verify_ssl_certs = False,
-                temperature = 0.0
+                temperature = 0.0,
+                max_connections = settings.LLM_MAX_CONNECTIONS,
             )
 
         else:
             raise ValueError(f'Неподдерживаемый провайдер: {provider}')
-        
 
-    async def astream_response(
-            self, formatted_context: str, query: str
-    ) -> AsyncGenerator[str, None]:
-        try:
-            system_message = SystemMessage(
-                content="""
-        Ты — помощник химика. Отвечай кратко, основываясь лишь на переданном контексте. 
-        Если требуется формула — оформляй её в блоке markdown с помощью `$$...$$` для отдельной строки или `$...$` для строки с текстом.
-
-        Пример 1:
-        Вопрос: Организация контроля питьевой воды.
-        Ответ: Организация и проведение производственного контроля должны соответствовать требо­ваниям ГОСТ 2874, ГОСТ 2761 и национальным санитарно-эпидемиологическим правилам и нормам,
-        установленным для предприятий пищевой промышленности, а также включать систему обеспечения и контроля качества.
 
-        Пример 2 (с формулой):
-        Вопрос: Как рассчитать молярную концентрацию раствора?
-        Ответ: Молярная концентрация рассчитывается по формуле:
-        $$ C = \frac{n}{V} $$
-        где $C$ — молярная концентрация (моль/л), $n$ — количество вещества (моль), $V$ — объём раствора (л).
-        """
-        )
-            human_message = HumanMessage(
-                content = f'Вопрос: {query}\nКонтекст: {formatted_context}.'
-            )
+    def build_messages(self, formatted_context: str, query: str) -> list:
+        return [
+            SystemMessage(content=SYSTEM_PROMPT),
+            HumanMessage(content=f'Вопрос: {query}\nКонтекст: {formatted_context}.'),
+        ]
 
-            async for chunk in self.llm.astream([system_message, human_message]):
+    async def astream(self, formatted_context: str, query: str) -> AsyncGenerator[str, None]:
+        """Поток ответа провайдера; исключения пробрасываются вызывающему."""
+        async with self._streams:
+            async for chunk in self.llm.astream(self.build_messages(formatted_context, query)):
                 if chunk.content:
                     yield chunk.content
 
+    async def astream_response(
+            self, formatted_context: str, query: str
+    ) -> AsyncGenerator[str, None]:
+        try:
+            async for chunk in metrics.timed_stream(self.astream(formatted_context, query), provider=self.provider):
+                yield chunk
+
         except Exception as e:
             print(f'Error {e}')
-            yield "Ошибка"
+            yield ERROR_MESSAGE
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.client.normalization import normalize_query
+from src.config import settings
+from src.create_database.manifest import format_chunk_id
+
+
+class LRUCache:
+    """Ограниченный по размеру LRU-кэш в памяти со счётчиками попаданий."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """LRU-кэш, записи которого устаревают через ttl секунд."""
+
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__(max_size)
+        self.ttl = ttl
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is not None and item[0] < time.monotonic():
+            del self._data[key]
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        super().put(key, (time.monotonic() + self.ttl, value))
+
+
+class QueryEmbeddingCache:
+    """Кэш эмбеддингов запросов: LRU в памяти и необязательный уровень на диске (SQLite).
+
+    Ключ — модель эмбеддингов и нормализованный текст запроса.
+    """
+
+    def __init__(self, model_name: str, max_size: int, disk_path: str | None = None):
+        self.model_name = model_name
+        self.memory = LRUCache(max_size)
+        self.disk_hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)'
+            )
+            self._conn.commit()
+
+    def key(self, query: str) -> str:
+        return hashlib.sha256(f'{self.model_name}\0{normalize_query(query)}'.encode('utf-8')).hexdigest()
+
+    def get(self, query: str) -> list[float] | None:
+        """Поиск в памяти. Промах на диске проверяется отдельно через get_disk."""
+        vector = self.memory.get(self.key(query))
+        if vector is None and self._conn is None:
+            self.misses += 1
+        return vector
+
+    def get_disk(self, queries: list[str]) -> list[list[float] | None]:
+        """Поиск на диске; вызывается из пула потоков, чтобы SELECT не блокировал event loop.
+
+        Найденное в память кладёт вызывающий (через put) — уже в event loop.
+        """
+        keys = [self.key(query) for query in queries]
+        with self._lock:
+            rows = [
+                self._conn.execute('SELECT vector FROM embeddings WHERE key = ?', (key,)).fetchone()
+                for key in keys
+            ]
+            found = sum(row is not None for row in rows)
+            self.disk_hits += found
+            self.misses += len(rows) - found
+        return [np.frombuffer(row[0], dtype=np.float32).tolist() if row else None for row in rows]
+
+    @property
+    def persistent(self) -> bool:
+        return self._conn is not None
+
+    def put(self, query: str, vector: list[float]):
+        self.memory.put(self.key(query), vector)
+
+    def put_disk(self, query: str, vector: list[float]):
+        """Запись на диск; вызывается из пула потоков, чтобы не блокировать event loop."""
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO embeddings VALUES (?, ?)', (self.key(query), blob))
+
+    def stats(self) -> dict:
+        return {
+            'memory_hits': self.memory.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_size': len(self.memory),
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def context_fingerprint(results: list[tuple[Document, float]]) -> str:
+    """Отпечаток найденного контекста: id фрагментов и их содержимое.
+
+    Меняется при пересборке индекса, поэтому кэш ответов сбрасывается сам.
+    """
+    digest = hashlib.sha256()
+    for doc, _ in results:
+        chunk_id = format_chunk_id(doc.metadata.get('category'), doc.metadata.get('source'), doc.metadata.get('chunk'))
+        digest.update(chunk_id.encode('utf-8'))
+        digest.update(hashlib.sha256(doc.page_content.encode('utf-8')).digest())
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """Кэш ответов LLM для /ask_with_ai.
+
+    Ключ — нормализованный запрос, категория, провайдер и отпечаток контекста.
+    Хранится список фрагментов потока, чтобы отдать ответ в том же chunked-формате.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.entries = TTLCache(max_size, ttl)
+
+    @staticmethod
+    def key(query: str, category: str | None, provider: str, fingerprint: str) -> tuple:
+        return normalize_query(query), category, provider, fingerprint
+
+    def get(self, key: tuple) -> list[str] | None:
+        return self.entries.get(key)
+
+    def put(self, key: tuple, chunks: list[str]):
+        self.entries.put(key, chunks)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.entries.hits,
+            'misses': self.entries.misses,
+            'size': len(self.entries),
+        }
+
+
+answer_cache = AnswerCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL_S)
+
+
+def get_answer_cache() -> AnswerCache:
+    return answer_cache
@@ -1,50 +1,193 @@
-import torch
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import AsyncIterator
+
+import numpy as np
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from loguru import logger
 
+from src.client.cache import QueryEmbeddingCache
+from src.client.embedding_batcher import EmbeddingBatcher
+from src.client.embeddings import create_embeddings
+from src.client.lexical_index import LexicalIndex, lexical_index_path, reciprocal_rank_fusion
 from src.config import settings
+from src.create_database.manifest import format_chunk_id, load_manifest
+from src.metrics import metrics
+
+
+def merge_by_score(results: list[list[tuple[Document, float]]], k: int) -> list[tuple[Document, float]]:
+    """Объединение результатов нескольких коллекций по расстоянию (меньше — ближе)."""
+    return sorted(chain.from_iterable(results), key=lambda item: item[1])[:k]
+
+
+def chunk_id(doc: Document) -> str:
+    """id фрагмента в коллекции (как при записи в chroma_pdf.write_batch)."""
+    return format_chunk_id(doc.metadata.get('category'), doc.metadata.get('source'), doc.metadata.get('chunk'))
+
+
+def cosine_distance(a, b) -> float:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    return float(1 - a @ b / (np.linalg.norm(a) * np.linalg.norm(b) or 1.0))
+
 
 class ChromaDatabase:
     def __init__(self):
         self.store: Chroma | None = None
+        # Коллекции по категориям, если база построена с layout='per_category'.
+        self.stores: dict[str, Chroma] = {}
+        self.executor: ThreadPoolExecutor | None = None
+        self.batcher: EmbeddingBatcher | None = None
+        self.query_cache: QueryEmbeddingCache | None = None
+        self.lexical: LexicalIndex | None = None
+        self.lexical_stats = {'identifier': 0, 'hybrid': 0}
 
-    async def init(self):
-        """Инициализация бд Chroma."""
+    async def init(self, embeddings: Embeddings | None = None):
+        """Инициализация бд Chroma; embeddings — модель вместо create_embeddings()."""
         try:
-            device = settings.DEVICE
+            embeddings = embeddings or create_embeddings(concurrent_calls=settings.SEARCH_WORKERS)
+
+            # Раскладка берётся из манифеста: с ней база была построена.
+            manifest = load_manifest()
+            layout = (manifest['params'] or {}).get('layout') or settings.COLLECTION_LAYOUT
+            if layout != settings.COLLECTION_LAYOUT:
+                logger.warning(
+                    f'База построена с раскладкой {layout}, а COLLECTION_LAYOUT={settings.COLLECTION_LAYOUT}: '
+                    f'используется {layout}'
+                )
+
+            if layout == 'per_category':
+                collections = manifest.get('collections', {})
+                if not collections:
+                    raise RuntimeError(
+                        f'Раскладка per_category, но в манифесте {settings.CHROMA_PATH} нет коллекций категорий: '
+                        f'постройте базу (python -m src.create_database.chroma_pdf --layout per_category)'
+                    )
+                self.stores = {
+                    category: Chroma(
+                        persist_directory=settings.CHROMA_PATH,
+                        embedding_function=embeddings,
+                        collection_name=name,
+                        collection_metadata={'hnsw:space': 'cosine'},
+                    )
+                    for category, name in collections.items()
+                }
+            else:
+                self.store = Chroma(
+                    persist_directory=settings.CHROMA_PATH,
+                    embedding_function=embeddings,
+                    collection_name=settings.COLLECTION_NAME,
+                    collection_metadata={'hnsw:space': 'cosine'},
+                )
 
-            embeddings = HuggingFaceEmbeddings(
-                model_name=settings.LM_MODEL_NAME,
-                model_kwargs={'device': device},
-                encode_kwargs={'normalize_embeddings': True}
+            # Эмбеддинг запроса и поиск HNSW выполняются вне event loop.
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.SEARCH_WORKERS, thread_name_prefix='chroma-search',
             )
+            self.batcher = EmbeddingBatcher(
+                embeddings,
+                self.executor,
+                max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+            )
+            self.batcher.start()
 
-            self.store = Chroma(
-                persist_directory=settings.CHROMA_PATH,
-                embedding_function=embeddings,
-                collection_name=settings.COLLECTION_NAME,
-                collection_metadata={'hnsw:space': 'cosine'},
+            self.query_cache = QueryEmbeddingCache(
+                f'{settings.LM_MODEL_NAME}:{settings.EMBEDDING_BACKEND}',
+                max_size=settings.QUERY_CACHE_SIZE,
+                disk_path=settings.QUERY_CACHE_PATH,
             )
 
-            logger.success(f'Подключение к коллекции {settings.COLLECTION_NAME}')
+            if settings.SEARCH_MODE == 'hybrid':
+                path = lexical_index_path()
+                if os.path.exists(path) and 'lexical' in manifest and not manifest['lexical']:
+                    logger.warning(
+                        f'Лексический индекс ({path}) не синхронизирован с базой (сборка не завершена), '
+                        f'поиск только по векторам'
+                    )
+                elif os.path.exists(path):
+                    self.lexical = LexicalIndex.load(path)
+                    logger.success(f'Лексический индекс: {len(self.lexical)} фрагментов')
+                else:
+                    logger.warning(f'Лексический индекс не найден ({path}), поиск только по векторам')
+
+            if self.stores:
+                logger.success(f'Подключение к коллекциям категорий: {list(self.stores)}')
+            else:
+                logger.success(f'Подключение к коллекции {settings.COLLECTION_NAME}')
         except Exception as e:
             logger.exception(f'Ошибка при инициализации Chroma: {e}')
             raise
 
 
+    @property
+    def initialized(self) -> bool:
+        return self.executor is not None
+
+    def _route(self, filter: dict | None) -> list[tuple[Chroma, dict | None]]:
+        """Коллекции для поиска и фильтр, который нужно применить в каждой.
+
+        Фильтр только по категории при раскладке по категориям превращается
+        в выбор коллекции; остальные запросы идут во все коллекции.
+        """
+        if not self.stores:
+            return [(self.store, filter)]
+        if filter and list(filter) == ['category'] and isinstance(filter['category'], str):
+            store = self.stores.get(filter['category'])
+            return [(store, None)] if store else []
+        return [(store, filter) for store in self.stores.values()]
+
+    async def embed_query(self, query: str) -> list[float]:
+        """Эмбеддинг запроса: из кэша или через микробатчер."""
+        with metrics.span('embedding'):
+            embedding = self.query_cache.get(query)
+            if embedding is None and self.query_cache.persistent:
+                loop = asyncio.get_running_loop()
+                [embedding] = await loop.run_in_executor(self.executor, self.query_cache.get_disk, [query])
+                if embedding is not None:
+                    self.query_cache.put(query, embedding)
+            if embedding is None:
+                embedding = await self.batcher.embed(query)
+                self.query_cache.put(query, embedding)
+                if self.query_cache.persistent:
+                    await loop.run_in_executor(self.executor, self.query_cache.put_disk, query, embedding)
+        return embedding
+
+    async def search_by_vector(self, embedding: list[float], filter: dict | None = None, k: int = 3):
+        """Поиск по вектору; несколько коллекций опрашиваются параллельно."""
+        loop = asyncio.get_running_loop()
+        with metrics.span('chroma_query'):
+            results = await asyncio.gather(*(
+                loop.run_in_executor(
+                    self.executor,
+                    lambda store=store, filter=store_filter: store.similarity_search_by_vector_with_relevance_scores(
+                        embedding, k=k, filter=filter,
+                    ),
+                )
+                for store, store_filter in self._route(filter)
+            ))
+        if len(results) == 1:
+            return results[0]
+        return merge_by_score(results, k)
+
     async def search_document(self, query: str, filter: dict | None = None, with_score=True, k: int = 3):
         """Поиск документа в Chroma."""
-        if not self.store:
+        if not self.initialized:
             raise RuntimeError('Хранилище не инициализировано')
-        
+
         logger.info(f'Поиск документов по запросу: {query}')
 
         try:
-            if with_score:
-                results = self.store.similarity_search_with_score(query, k=k, filter=filter)
-            else:
-                results = self.store.similarity_search(query, k=k, filter=filter)
+            results = await self.lexical_search(query, filter, k) if self.lexical else None
+            if results is None:
+                embedding = await self.embed_query(query)
+                results = await self.search_by_vector(embedding, filter=filter, k=k)
+            if not with_score:
+                results = [doc for doc, _ in results]
 
             logger.debug(f'Найдено {len(results)} документов')
             return results
@@ -53,9 +196,235 @@ class ChromaDatabase:
             raise
 
 
-    def close(self):
+    def _get_chunks(self, ids: list[str], with_embeddings: bool = False) -> dict[str, tuple[Document, list | None]]:
+        """Фрагменты (и при необходимости их векторы) по id из лексического индекса."""
+        by_store: dict[int, tuple[Chroma, list[str]]] = {}
+        for chunk in ids:
+            store = self.stores.get(self.lexical.category_of(chunk)) if self.stores else self.store
+            if store is not None:
+                by_store.setdefault(id(store), (store, []))[1].append(chunk)
+
+        include = ['documents', 'metadatas', *(['embeddings'] if with_embeddings else [])]
+        found = {}
+        for store, store_ids in by_store.values():
+            page = store._collection.get(ids=store_ids, include=include)
+            vectors = page['embeddings'] if with_embeddings else [None] * len(page['ids'])
+            for chunk, text, metadata, vector in zip(page['ids'], page['documents'], page['metadatas'], vectors):
+                found[chunk] = (Document(page_content=text, metadata=metadata or {}), vector)
+        return found
+
+    def _lexical_scope(self, filter: dict | None) -> tuple[bool, str | None]:
+        """Применим ли лексический индекс к фильтру (нет фильтра или только категория) и категория для него."""
+        if self.lexical is None:
+            return False, None
+        if not filter:
+            return True, None
+        if list(filter) == ['category'] and isinstance(filter['category'], str):
+            return True, filter['category']
+        return False, None
+
+    async def _identifier_search(self, query: str, category: str | None, k: int):
+        """Быстрый путь по обозначению стандарта: только BM25, без эмбеддинга, расстояние 0.
+
+        None — в запросе нет обозначений, найденных в индексе.
+        """
+        loop = asyncio.get_running_loop()
+        with metrics.span('lexical'):
+            hits = await loop.run_in_executor(self.executor, self.lexical.lookup, query, category, k)
+        if not hits:
+            return None
+        self.lexical_stats['identifier'] += 1
+        chunks = await loop.run_in_executor(self.executor, self._get_chunks, [chunk for chunk, _ in hits])
+        return [(chunks[chunk][0], 0.0) for chunk, _ in hits if chunk in chunks]
+
+    async def _fuse(self, embedding: list[float], dense_results: list, lexical_results: list, k: int):
+        """Слияние векторной и BM25-выдачи RRF; найденным только BM25 расстояние считается по вектору из Chroma."""
+        self.lexical_stats['hybrid'] += 1
+        by_id = {chunk_id(doc): (doc, score) for doc, score in dense_results}
+        fused = reciprocal_rank_fusion([list(by_id), [chunk for chunk, _ in lexical_results]])[:k]
+        missing = [chunk for chunk in fused if chunk not in by_id]
+        if missing:
+            loop = asyncio.get_running_loop()
+            chunks = await loop.run_in_executor(self.executor, self._get_chunks, missing, True)
+            for chunk, (doc, vector) in chunks.items():
+                by_id[chunk] = (doc, cosine_distance(embedding, vector))
+        return [by_id[chunk] for chunk in fused if chunk in by_id]
+
+    async def lexical_search(self, query: str, filter: dict | None, k: int):
+        """Поиск с лексическим индексом; None — индекс к запросу не применим (фильтр не по категории).
+
+        Запрос с обозначением стандарта, найденным в индексе, обслуживается
+        только BM25 без эмбеддинга; у таких результатов расстояние 0.
+        Остальные — параллельно BM25 и векторный поиск, слияние RRF. Порядок
+        гибридной выдачи — по RRF, оценка — косинусное расстояние до запроса,
+        как у обычного поиска (у найденных только BM25 считается по вектору из Chroma).
+        """
+        applicable, category = self._lexical_scope(filter)
+        if not applicable:
+            return None
+        results = await self._identifier_search(query, category, k)
+        if results is not None:
+            return results
+
+        candidates = max(k, settings.LEXICAL_CANDIDATES)
+        loop = asyncio.get_running_loop()
+
+        async def dense():
+            embedding = await self.embed_query(query)
+            return embedding, await self.search_by_vector(embedding, filter=filter, k=candidates)
+
+        async def lexical():
+            with metrics.span('lexical'):
+                return await loop.run_in_executor(self.executor, self.lexical.search, query, category, candidates)
+
+        (embedding, dense_results), lexical_results = await asyncio.gather(dense(), lexical())
+        return await self._fuse(embedding, dense_results, lexical_results, k)
+
+    async def embed_many(self, queries: list[str]) -> list[list[float]]:
+        """Эмбеддинги запросов: из кэша, остальные — одним батчевым вызовом модели."""
+        loop = asyncio.get_running_loop()
+        embeddings = [self.query_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if missing and self.query_cache.persistent:
+            stored = await loop.run_in_executor(self.executor, self.query_cache.get_disk, missing)
+            found = {query: vector for query, vector in zip(missing, stored) if vector is not None}
+            for query, vector in found.items():
+                self.query_cache.put(query, vector)
+            embeddings = [e if e is not None else found.get(q) for q, e in zip(queries, embeddings)]
+            missing = [query for query in missing if query not in found]
+        if missing:
+            with metrics.span('embedding_batch'):
+                vectors = await loop.run_in_executor(
+                    self.executor, self.batcher.embeddings.embed_documents, missing,
+                )
+            computed = dict(zip(missing, vectors))
+            for query, vector in computed.items():
+                self.query_cache.put(query, vector)
+                if self.query_cache.persistent:
+                    await loop.run_in_executor(self.executor, self.query_cache.put_disk, query, vector)
+            embeddings = [e if e is not None else computed[q] for q, e in zip(queries, embeddings)]
+        return embeddings
+
+    @staticmethod
+    def _query_many(store: Chroma, embeddings: list[list[float]], filter: dict | None, k: int):
+        """Один запрос к коллекции сразу для нескольких векторов с общим фильтром."""
+        results = store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=filter or None,
+            include=['documents', 'metadatas', 'distances'],
+        )
+        return [
+            [
+                (Document(page_content=text, metadata=metadata or {}), distance)
+                for text, metadata, distance in zip(texts, metadatas, distances)
+            ]
+            for texts, metadatas, distances in zip(
+                results['documents'], results['metadatas'], results['distances'],
+            )
+        ]
+
+    async def iter_search_batch(
+            self, queries: list[str], filters: list[dict | None], k: int = 3,
+    ) -> AsyncIterator[tuple[int, list[tuple[Document, float]]]]:
+        """Пакетный поиск: (индекс запроса, результаты) по мере готовности.
+
+        Выдача та же, что у search_document: с лексическим индексом запросы
+        с обозначениями стандартов обслуживаются только BM25, остальные —
+        слиянием RRF векторной и BM25-выдачи. Все эмбеддинги считаются одним
+        вызовом, запросы с одинаковым фильтром уходят в Chroma одним query.
+        """
+        if not self.initialized:
+            raise RuntimeError('Хранилище не инициализировано')
+
+        logger.info(f'Пакетный поиск: {len(queries)} запросов')
+        loop = asyncio.get_running_loop()
+        scopes = [self._lexical_scope(filter) for filter in filters]
+
+        async def identifier_search(i: int):
+            return i, await self._identifier_search(queries[i], scopes[i][1], k)
+
+        found = await asyncio.gather(*(identifier_search(i) for i, (applicable, _) in enumerate(scopes) if applicable))
+        answered = {i: results for i, results in found if results is not None}
+        for i, results in answered.items():
+            yield i, results
+
+        remaining = [i for i in range(len(queries)) if i not in answered]
+        if not remaining:
+            return
+        embeddings = dict(zip(remaining, await self.embed_many([queries[i] for i in remaining])))
+
+        groups: dict[str, list[int]] = {}
+        for i in remaining:
+            groups.setdefault(json.dumps(filters[i], sort_keys=True, ensure_ascii=False), []).append(i)
+
+        async def dense(indices: list[int], n: int):
+            group_embeddings = [embeddings[i] for i in indices]
+            with metrics.span('chroma_query_batch'):
+                per_store = await asyncio.gather(*(
+                    loop.run_in_executor(self.executor, self._query_many, store, group_embeddings, store_filter, n)
+                    for store, store_filter in self._route(filters[indices[0]])
+                ))
+            if not per_store:
+                return [[] for _ in indices]
+            if len(per_store) == 1:
+                return per_store[0]
+            return [merge_by_score(list(results), n) for results in zip(*per_store)]
+
+        async def lexical(indices: list[int], category: str | None, n: int):
+            with metrics.span('lexical'):
+                return await asyncio.gather(*(
+                    loop.run_in_executor(self.executor, self.lexical.search, queries[i], category, n)
+                    for i in indices
+                ))
+
+        async def search_group(indices: list[int]):
+            applicable, category = scopes[indices[0]]
+            if not applicable:
+                return indices, await dense(indices, k)
+            candidates = max(k, settings.LEXICAL_CANDIDATES)
+            dense_results, lexical_results = await asyncio.gather(
+                dense(indices, candidates), lexical(indices, category, candidates),
+            )
+            return indices, [
+                await self._fuse(embeddings[i], dense_result, lexical_result, k)
+                for i, dense_result, lexical_result in zip(indices, dense_results, lexical_results)
+            ]
+
+        tasks = [asyncio.create_task(search_group(indices)) for indices in groups.values()]
+        try:
+            for task in asyncio.as_completed(tasks):
+                indices, results = await task
+                for i, result in zip(indices, results):
+                    yield i, result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search_batch(
+            self, queries: list[str], filters: list[dict | None], k: int = 3,
+    ) -> list[list[tuple[Document, float]]]:
+        """Пакетный поиск, результаты в порядке запросов."""
+        results = [[] for _ in queries]
+        async for i, result in self.iter_search_batch(queries, filters, k):
+            results[i] = result
+        return results
+
+    async def close(self):
         logger.info("Отключение Chroma")
-        pass
+        if self.batcher:
+            await self.batcher.stop()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        if self.query_cache:
+            self.query_cache.close()
+
+    def stats(self) -> dict:
+        """Счётчики кэша эмбеддингов запросов и лексического поиска."""
+        return {
+            'query_embedding_cache': self.query_cache.stats() if self.query_cache else {},
+            'lexical': {'documents': len(self.lexical), **self.lexical_stats} if self.lexical else {},
+        }
 
 
 chroma_database = ChromaDatabase()
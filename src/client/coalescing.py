@@ -0,0 +1,118 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вызовов.
+
+    Пока выполняется вызов с ключом, остальные вызовы с тем же ключом ждут
+    его результат (или исключение) вместо собственного вызова.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.shared += 1
+        # shield: отключение одного клиента не отменяет общий вызов для остальных.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {'calls': self.calls, 'shared': self.shared, 'inflight': len(self._inflight)}
+
+
+class StreamFanout:
+    """Один поток upstream, раздаваемый нескольким подписчикам.
+
+    Полученные фрагменты буферизуются: подписчик, подключившийся позже,
+    сначала получает уже выданные фрагменты, затем продолжение потока.
+    Поток дочитывается до конца, даже если все подписчики отключились.
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self._updated = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._updated.wait()
+
+
+class StreamCoalescer:
+    """Объединение одинаковых одновременных потоков: один upstream на ключ."""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, StreamFanout] = {}
+        self.streams = 0
+        self.joined = 0
+
+    def subscribe(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        fanout = self._inflight.get(key)
+        if fanout is None:
+            self.streams += 1
+            fanout = StreamFanout(factory())
+            self._inflight[key] = fanout
+            fanout.task.add_done_callback(lambda _: self._forget(key, fanout))
+        else:
+            self.joined += 1
+        return fanout.subscribe()
+
+    def _forget(self, key: Hashable, fanout: StreamFanout):
+        if self._inflight.get(key) is fanout:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {'streams': self.streams, 'joined': self.joined, 'inflight': len(self._inflight)}
+
+
+search_flight = SingleFlight()
+answer_streams = StreamCoalescer()
+
+
+def get_search_flight() -> SingleFlight:
+    return search_flight
+
+
+def get_answer_streams() -> StreamCoalescer:
+    return answer_streams
@@ -0,0 +1,131 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+from langchain_core.documents import Document
+from loguru import logger
+
+from src.config import settings
+from src.create_database.token_chunking import cut_point
+
+# Перекрытие соседних фрагментов короче этого числа символов не ищется (случайные совпадения).
+MIN_OVERLAP_CHARS = 16
+# Последний блок, не влезающий в бюджет, обрезается, только если остаётся хотя бы столько токенов.
+MIN_TRUNCATED_TOKENS = 32
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """Токенайзер модели эмбеддингов (LM_MODEL_NAME) для подсчёта токенов контекста.
+
+    Загружается при первом обращении; API загружает его заранее в lifespan.
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(settings.LM_MODEL_NAME)
+
+
+class Passage(NamedTuple):
+    """Склеенные соседние фрагменты одного документа."""
+    source: str | None
+    first_chunk: int | None
+    last_chunk: int | None
+    text: str
+    rank: int
+
+
+def strip_overlap(previous: str, text: str) -> str:
+    """Начало text без части, совпадающей с хвостом previous (перекрытие окон разбиения)."""
+    probe = text[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return text
+    start = max(len(previous) - len(text), 0)
+    while (start := previous.find(probe, start)) != -1:
+        # Первое вхождение даёт самое длинное перекрытие.
+        if text.startswith(previous[start:]):
+            return text[len(previous) - start:].lstrip()
+        start += 1
+    return text
+
+
+def stitch(results: list[tuple[Document, float]]) -> list[Passage]:
+    """Склейка фрагментов одного source с подряд идущими номерами chunk.
+
+    Порядок — по лучшему (первому в выдаче) фрагменту каждого блока.
+    Фрагменты без номера (старые индексы) остаются отдельными блоками.
+    """
+    ranked = [(rank, doc) for rank, (doc, _) in enumerate(results)]
+    ranked.sort(key=lambda item: (
+        item[1].metadata.get('chunk') is None,
+        str(item[1].metadata.get('source')),
+        item[1].metadata.get('chunk') or 0,
+        item[0],
+    ))
+
+    passages: list[Passage] = []
+    for rank, doc in ranked:
+        source, chunk = doc.metadata.get('source'), doc.metadata.get('chunk')
+        last = passages[-1] if passages else None
+        if last and chunk is not None and last.source == source and last.last_chunk is not None:
+            if chunk == last.last_chunk:
+                # Один и тот же фрагмент из нескольких коллекций.
+                continue
+            if chunk == last.last_chunk + 1:
+                passages[-1] = last._replace(
+                    last_chunk=chunk,
+                    text=f'{last.text} {strip_overlap(last.text, doc.page_content)}',
+                    rank=min(last.rank, rank),
+                )
+                continue
+        passages.append(Passage(source, chunk, chunk, doc.page_content, rank))
+
+    return sorted(passages, key=lambda passage: passage.rank)
+
+
+def pack_blocks(
+    results: list[tuple[Document, float]], max_tokens: int, min_similarity: float, tokenizer=None,
+) -> list[str]:
+    """Блоки контекста для LLM из результатов поиска, уложенные в бюджет max_tokens.
+
+    Отбрасываются фрагменты со сходством (1 - косинусное расстояние) ниже
+    min_similarity, соседние фрагменты одного документа склеиваются без
+    перекрытия, блоки добавляются по убыванию релевантности, а не
+    поместившийся целиком — обрезается по границе предложения.
+    Пустой список, если подходящих фрагментов нет.
+    """
+    relevant = [(doc, score) for doc, score in results if 1 - score >= min_similarity]
+    if not relevant:
+        logger.info(f'Контекст: все {len(results)} фрагментов ниже порога сходства {min_similarity}')
+        return []
+
+    tokenizer = tokenizer or get_tokenizer()
+    count = lambda text: len(tokenizer(text, add_special_tokens=False, verbose=False)['input_ids'])
+    tokens_before = sum(count(doc.page_content) for doc, _ in results)
+
+    blocks, used = [], 0
+    for passage in stitch(relevant):
+        offsets = tokenizer(
+            passage.text, add_special_tokens=False, return_offsets_mapping=True, verbose=False,
+        )['offset_mapping']
+        remaining = max_tokens - used
+        if len(offsets) <= remaining:
+            blocks.append(passage.text)
+            used += len(offsets)
+            continue
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            end = cut_point(passage.text, offsets, 0, remaining)
+            blocks.append(passage.text[:offsets[end - 1][1]].rstrip())
+            used += end
+        break
+
+    logger.info(
+        f'Контекст: {tokens_before} -> {used} токенов, фрагментов {len(results)} -> {len(relevant)}, '
+        f'блоков {len(blocks)}'
+    )
+    return blocks
+
+
+def pack_context(
+    results: list[tuple[Document, float]], max_tokens: int, min_similarity: float, tokenizer=None,
+) -> str:
+    """Контекст для LLM одной строкой (см. pack_blocks); пустая строка, если подходящих фрагментов нет."""
+    return '\n'.join(pack_blocks(results, max_tokens, min_similarity, tokenizer))
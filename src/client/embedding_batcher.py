@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import Executor
+
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+
+class EmbeddingBatcher:
+    """Динамический микробатчинг эмбеддингов запросов.
+
+    Запросы, пришедшие в течение max_wait_ms после первого (но не более
+    max_batch_size), считаются одним вызовом embed_documents в пуле потоков,
+    так что event loop не блокируется forward pass'ом модели.
+    """
+
+    def __init__(self, embeddings: Embeddings, executor: Executor,
+                 max_batch_size: int, max_wait_ms: float):
+        self.embeddings = embeddings
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future]] | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def embed(self, text: str) -> list[float]:
+        if self._task is None:
+            raise RuntimeError('Батчер эмбеддингов не запущен')
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> list[tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        pending: set[asyncio.Task] = set()
+        try:
+            while True:
+                batch = await self._collect()
+                # Пока пачка считается, следующая уже набирается.
+                task = asyncio.create_task(self._embed_batch(batch))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _embed_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        batch = [(text, future) for text, future in batch if not future.done()]
+        if not batch:
+            return
+        texts = [text for text, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(self.executor, self.embeddings.embed_documents, texts)
+        except Exception as e:
+            logger.exception(f'Ошибка вычисления эмбеддингов: {e}')
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.debug(f'Эмбеддинги: пачка из {len(texts)} запросов')
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
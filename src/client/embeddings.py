@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+from src.config import settings
+
+
+ONNX_FP32_NAME = 'model.onnx'
+ONNX_INT8_NAME = 'model.int8.onnx'
+
+
+def export_onnx_int8(model_name: str, model_dir: str) -> str:
+    """Экспорт модели в ONNX и динамическое квантование весов в int8.
+
+    Результат кэшируется в model_dir: повторный вызов только возвращает путь.
+    """
+    int8_path = os.path.join(model_dir, ONNX_INT8_NAME)
+    if os.path.exists(int8_path):
+        return int8_path
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    class _Encoder(torch.nn.Module):
+        # Именованные аргументы: позиционный порядок forward различается между версиями transformers.
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    logger.info(f'Экспорт {model_name} в ONNX: {model_dir}')
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(['пример запроса'], return_tensors='pt')
+
+    fp32_path = os.path.join(model_dir, ONNX_FP32_NAME)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model),
+            (sample['input_ids'], sample['attention_mask']),
+            fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'last_hidden_state': {0: 'batch', 1: 'sequence'},
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(model_dir)
+    os.remove(fp32_path)
+    logger.success(f'Квантованная модель сохранена: {int8_path}')
+    return int8_path
+
+
+class OnnxInt8Embeddings(Embeddings):
+    """Эмбеддинги sentence-transformers через ONNX Runtime с int8-весами на CPU.
+
+    Mean pooling по маске внимания и L2-нормировка — как у HuggingFaceEmbeddings
+    с normalize_embeddings=True.
+    """
+
+    def __init__(
+            self,
+            model_name: str,
+            model_dir: str,
+            num_threads: int,
+            max_seq_length: int = 128,
+            batch_size: int = 32,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = export_onnx_int8(model_name, model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors='np',
+        )
+        mask = encoded['attention_mask'].astype(np.int64)
+        hidden = self.session.run(None, {
+            'input_ids': encoded['input_ids'].astype(np.int64),
+            'attention_mask': mask,
+        })[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = [
+            self._embed(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text])[0].tolist()
+
+
+def create_embeddings(backend: str | None = None, concurrent_calls: int = 1) -> Embeddings:
+    """Модель эмбеддингов по settings.EMBEDDING_BACKEND: 'torch' или 'onnx-int8'.
+
+    Используется и сервером, и построением базы, чтобы векторы совпадали.
+    concurrent_calls — сколько потоков одновременно вызывают модель: при
+    ONNX_NUM_THREADS=None ядра делятся между ними, чтобы не было переподписки CPU.
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == 'onnx-int8':
+        num_threads = settings.ONNX_NUM_THREADS or max(1, (os.cpu_count() or 1) // concurrent_calls)
+        return OnnxInt8Embeddings(
+            settings.LM_MODEL_NAME,
+            os.path.join(settings.ONNX_MODEL_DIR, settings.LM_MODEL_NAME.replace('/', '--')),
+            num_threads=num_threads,
+            max_seq_length=settings.EMBEDDING_MAX_TOKENS,
+        )
+    if backend == 'torch':
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(
+            model_name=settings.LM_MODEL_NAME,
+            model_kwargs={'device': settings.DEVICE},
+            encode_kwargs={'normalize_embeddings': True},
+        )
+    raise ValueError(f'Неподдерживаемый бэкенд эмбеддингов: {backend}')
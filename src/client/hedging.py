@@ -0,0 +1,124 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator
+
+from loguru import logger
+
+from src.client.ai_chat import ERROR_MESSAGE, ChatWithAI
+from src.metrics import metrics
+
+
+@dataclass
+class _Candidate:
+    chat: ChatWithAI
+    queue: asyncio.Queue
+    pump: asyncio.Task
+
+
+async def _pump(chat: ChatWithAI, formatted_context: str, query: str, queue: asyncio.Queue):
+    """Перекладывает поток провайдера в очередь событий ('chunk' | 'done' | 'error', значение)."""
+    try:
+        async for chunk in chat.astream(formatted_context, query):
+            await queue.put(('chunk', chunk))
+        await queue.put(('done', None))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(('error', e))
+
+
+class HedgedChat:
+    """Хеджированный поток ответа с переключением между провайдерами.
+
+    Если основной провайдер не выдал первый токен за first_token_deadline
+    секунд или упал до первого токена, запускается запасной. Ответ отдаёт тот,
+    кто первым начал стримить, второй поток отменяется; его провайдер — в
+    answered_by (None, пока победитель не определён или если оба упали).
+    Экземпляр создаётся на один запрос (LLMRegistry.get).
+    """
+
+    def __init__(self, primary: ChatWithAI, secondary: ChatWithAI, first_token_deadline: float):
+        self.primary = primary
+        self.secondary = secondary
+        self.first_token_deadline = first_token_deadline
+        self.provider = primary.provider
+        self.answered_by: str | None = None
+
+    def _launch(self, chat: ChatWithAI, formatted_context: str, query: str) -> _Candidate:
+        queue = asyncio.Queue()
+        pump = asyncio.create_task(_pump(chat, formatted_context, query, queue))
+        return _Candidate(chat, queue, pump)
+
+    def astream_response(self, formatted_context: str, query: str) -> AsyncGenerator[str, None]:
+        return metrics.timed_stream(
+            self._astream_response(formatted_context, query),
+            provider=f'{self.primary.provider}+{self.secondary.provider}',
+        )
+
+    async def _astream_response(
+            self, formatted_context: str, query: str
+    ) -> AsyncGenerator[str, None]:
+        start = time.perf_counter()
+        candidates = [self._launch(self.primary, formatted_context, query)]
+        getters = {asyncio.ensure_future(candidates[0].queue.get()): candidates[0]}
+        secondary_started = False
+        winner, first_event = None, None
+
+        def start_secondary():
+            nonlocal secondary_started
+            secondary_started = True
+            candidate = self._launch(self.secondary, formatted_context, query)
+            candidates.append(candidate)
+            getters[asyncio.ensure_future(candidate.queue.get())] = candidate
+
+        try:
+            while getters and winner is None:
+                timeout = None
+                if not secondary_started:
+                    timeout = max(0.0, self.first_token_deadline - (time.perf_counter() - start))
+
+                done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.warning(
+                        f'{self.primary.provider}: нет первого токена за {self.first_token_deadline} с, '
+                        f'запускается {self.secondary.provider}'
+                    )
+                    start_secondary()
+                    continue
+
+                for getter in done:
+                    candidate = getters.pop(getter)
+                    kind, value = getter.result()
+                    if kind == 'error':
+                        logger.warning(f'{candidate.chat.provider}: ошибка до первого токена: {value}')
+                        if not secondary_started:
+                            start_secondary()
+                        continue
+                    winner, first_event = candidate, (kind, value)
+                    break
+
+            if winner is None:
+                yield ERROR_MESSAGE
+                return
+
+            self.answered_by = winner.chat.provider
+            ttft = time.perf_counter() - start
+            logger.info(f'TTFT {winner.chat.provider}: {ttft:.3f} с')
+            for candidate in candidates:
+                if candidate is not winner:
+                    candidate.pump.cancel()
+
+            kind, value = first_event
+            while kind == 'chunk':
+                yield value
+                kind, value = await winner.queue.get()
+
+            if kind == 'error':
+                logger.error(f'{winner.chat.provider}: ошибка во время потока: {value}')
+                yield ERROR_MESSAGE
+        finally:
+            for getter in getters:
+                getter.cancel()
+            for candidate in candidates:
+                candidate.pump.cancel()
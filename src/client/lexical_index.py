@@ -0,0 +1,309 @@
+import math
+import os
+import re
+from collections import Counter
+from functools import cached_property
+from itertools import islice
+from typing import Iterable
+
+import numpy as np
+
+from src.config import settings
+
+
+LEXICAL_INDEX_NAME = 'lexical_index.npz'
+
+# Обозначения стандартов: «ГОСТ 2874», «ГОСТ Р 51301», «ГОСТ Р ИСО 5725-1», «ГОСТ 12.1.004—91».
+# После номера через тире идут номер части и/или год; год в идентификатор не входит
+# (ссылки в тексте часто пишутся без него), номер части — входит.
+GOST_PATTERN = re.compile(
+    r'\b(ГОСТ|ОСТ|СТБ|СТ\s+РК)(\s+Р)?(?:\s+(ИСО|ISO|МЭК|IEC)(?:\s*/\s*(?:МЭК|IEC))?)?\s*(\d+(?:\.\d+)*)'
+    r'((?:\s?[-–—]\s?\d+\b){0,2})',
+    re.IGNORECASE,
+)
+SUFFIX_PATTERN = re.compile(r'\d+')
+# Двузначный суффикс у стандартов ИСО/МЭК — номер части, если он меньше этого
+# числа («ГОСТ Р ИСО 10993-10»), иначе год («ГОСТ Р ИСО 9001-96»).
+FIRST_TWO_DIGIT_YEAR = 90
+WORD_PATTERN = re.compile(r'\w+')
+# Грубый стемминг: слова длиннее STEM_LENGTH букв обрезаются, чтобы «натрия» и «натрий» совпадали.
+STEM_LENGTH = 5
+# Фрагментов в блоке при построении: словарь вхождений держится только для одного блока,
+# готовые блоки хранятся массивами и сливаются в конце.
+LEXICAL_BLOCK_SIZE = 10_000
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+
+def lexical_index_path(chroma_path: str = None) -> str:
+    return os.path.join(chroma_path or settings.CHROMA_PATH, LEXICAL_INDEX_NAME)
+
+
+def _part(suffixes: list[str], international: bool) -> str | None:
+    """Номер части среди чисел после тире: «5725-1-2002» -> 1, «2874-82» -> None."""
+    if len(suffixes) == 2:
+        return suffixes[0]
+    if len(suffixes) == 1:
+        suffix = suffixes[0]
+        if len(suffix) in (1, 3) or (
+                len(suffix) == 2 and international and int(suffix) < FIRST_TWO_DIGIT_YEAR):
+            return suffix
+    return None
+
+
+def _designations(text: str) -> list[tuple[str, str | None]]:
+    """Обозначения стандартов без года: (обозначение без части, номер части или None)."""
+    found = []
+    for prefix, national, international, number, suffix in GOST_PATTERN.findall(text):
+        parts = [' '.join(prefix.split()), national.strip(), {'ISO': 'ИСО', 'IEC': 'МЭК'}.get(
+            international.upper(), international)]
+        base = ' '.join(part.lower() for part in parts if part) + f' {number}'
+        found.append((base, _part(SUFFIX_PATTERN.findall(suffix), bool(international))))
+    return found
+
+
+def identifiers(text: str) -> set[str]:
+    """Нормализованные обозначения стандартов в тексте: {'гост р 51301', 'гост р исо 5725-1', ...}."""
+    return {f'{base}-{part}' if part else base for base, part in _designations(text)}
+
+
+def indexed_identifiers(text: str) -> set[str]:
+    """Обозначения для индекса: у стандарта с частью — ещё и без неё.
+
+    Запрос «ГОСТ Р ИСО 5725» находит все части, «ГОСТ Р ИСО 5725-1» — только первую.
+    """
+    found = set()
+    for base, part in _designations(text):
+        found.add(base)
+        if part:
+            found.add(f'{base}-{part}')
+    return found
+
+
+def terms(text: str) -> list[str]:
+    """Термы BM25: слова в нижнем регистре (ё -> е), буквенные — обрезанные до STEM_LENGTH."""
+    words = WORD_PATTERN.findall(text.lower().replace('ё', 'е'))
+    return [word[:STEM_LENGTH] if word.isalpha() else word for word in words]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """Слияние ранжирований по сумме 1 / (k + место)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """Инвертированный индекс BM25 по фрагментам базы в массивах numpy (CSR).
+
+    Словарь содержит термы-слова и обозначения стандартов (в них есть пробел,
+    поэтому со словами они не пересекаются). Тексты фрагментов не хранятся —
+    только id, категория и длина; сами фрагменты берутся из Chroma.
+    Индекс неизменяем: without и merge возвращают новый.
+    """
+
+    def __init__(self, ids: np.ndarray, categories: np.ndarray, category_names: list[str],
+                 lengths: np.ndarray, vocabulary: np.ndarray, indptr: np.ndarray,
+                 postings: np.ndarray, frequencies: np.ndarray):
+        self.ids = ids
+        self.categories = categories
+        self.category_names = list(category_names)
+        self.lengths = lengths
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.postings = postings
+        self.frequencies = frequencies
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    # Словари для поиска строятся при первом обращении: при сборке базы они не нужны.
+    @cached_property
+    def term_index(self) -> dict[str, int]:
+        return {term: i for i, term in enumerate(self.vocabulary.tolist())}
+
+    @cached_property
+    def positions(self) -> dict[str, int]:
+        return {doc_id: i for i, doc_id in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[tuple[str, str, str]],
+                       block_size: int = LEXICAL_BLOCK_SIZE) -> 'LexicalIndex':
+        """Индекс по (id, текст, категория), построенный блоками по block_size фрагментов.
+
+        Память — массивы индекса (несколько байт на вхождение терма) и словарь
+        вхождений одного блока, а не словарь по всему корпусу.
+        """
+        documents = iter(documents)
+        blocks = []
+        while block := list(islice(documents, block_size)):
+            blocks.append(cls._from_block(block))
+        return cls.merge(blocks)
+
+    @classmethod
+    def _from_block(cls, documents: Iterable[tuple[str, str, str]]) -> 'LexicalIndex':
+        ids, categories, lengths = [], [], []
+        category_codes: dict[str, int] = {}
+        inverted: dict[str, list[tuple[int, int]]] = {}
+        for doc, (doc_id, text, category) in enumerate(documents):
+            counts = Counter(terms(text))
+            counts.update(indexed_identifiers(text))
+            for term, count in counts.items():
+                inverted.setdefault(term, []).append((doc, count))
+            ids.append(doc_id)
+            categories.append(category_codes.setdefault(category, len(category_codes)))
+            lengths.append(sum(counts.values()))
+
+        vocabulary = sorted(inverted)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for i, term in enumerate(vocabulary):
+            indptr[i + 1] = indptr[i] + len(inverted[term])
+        postings = np.fromiter(
+            (doc for term in vocabulary for doc, _ in inverted[term]), dtype=np.int32, count=indptr[-1])
+        frequencies = np.fromiter(
+            (min(count, 65535) for term in vocabulary for _, count in inverted[term]),
+            dtype=np.uint16, count=indptr[-1])
+        return cls(
+            np.array(ids, dtype=str), np.array(categories, dtype=np.int16), list(category_codes),
+            np.array(lengths, dtype=np.int32), np.array(vocabulary, dtype=str), indptr, postings, frequencies,
+        )
+
+    @classmethod
+    def merge(cls, indexes: list['LexicalIndex']) -> 'LexicalIndex':
+        """Объединение индексов по непересекающимся наборам фрагментов (в порядке списка)."""
+        indexes = [index for index in indexes if len(index)]
+        if not indexes:
+            return cls._from_block([])
+        if len(indexes) == 1:
+            return indexes[0]
+
+        category_names = list(dict.fromkeys(name for index in indexes for name in index.category_names))
+        vocabulary = np.unique(np.concatenate([index.vocabulary for index in indexes]))
+        term_ids, postings, categories, offset = [], [], [], 0
+        for index in indexes:
+            positions = np.searchsorted(vocabulary, index.vocabulary)
+            term_ids.append(np.repeat(positions, np.diff(index.indptr)))
+            postings.append(index.postings + np.int32(offset))
+            codes = np.array([category_names.index(name) for name in index.category_names], dtype=np.int16)
+            categories.append(codes[index.categories])
+            offset += len(index)
+
+        # Стабильная сортировка по терму сохраняет порядок фрагментов внутри списка вхождений.
+        term_ids = np.concatenate(term_ids)
+        order = np.argsort(term_ids, kind='stable')
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=indptr[1:])
+        return cls(
+            np.concatenate([index.ids for index in indexes]), np.concatenate(categories), category_names,
+            np.concatenate([index.lengths for index in indexes]), vocabulary, indptr,
+            np.concatenate(postings)[order], np.concatenate([index.frequencies for index in indexes])[order],
+        )
+
+    def without(self, ids: Iterable[str]) -> 'LexicalIndex':
+        """Индекс без фрагментов ids (удалённые и изменённые файлы)."""
+        keep = ~np.isin(self.ids, np.array(list(ids), dtype=str))
+        if keep.all():
+            return self
+        # Новые номера оставшихся фрагментов и вхождения только по ним.
+        renumber = (np.cumsum(keep) - 1).astype(np.int32)
+        kept = keep[self.postings]
+        term_ids = np.repeat(np.arange(len(self.vocabulary)), np.diff(self.indptr))[kept]
+        counts = np.bincount(term_ids, minlength=len(self.vocabulary))
+        present = counts > 0
+        indptr = np.zeros(int(present.sum()) + 1, dtype=np.int64)
+        np.cumsum(counts[present], out=indptr[1:])
+        return LexicalIndex(
+            self.ids[keep], self.categories[keep], self.category_names, self.lengths[keep],
+            self.vocabulary[present], indptr, renumber[self.postings[kept]], self.frequencies[kept],
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Размер массивов индекса в памяти."""
+        return sum(array.nbytes for array in (
+            self.ids, self.categories, self.lengths, self.vocabulary, self.indptr, self.postings, self.frequencies,
+        ))
+
+    def save(self, path: str):
+        """Атомарная запись индекса (через временный файл)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(
+            tmp_path, ids=self.ids, categories=self.categories, category_names=np.array(self.category_names, dtype=str),
+            lengths=self.lengths, vocabulary=self.vocabulary, indptr=self.indptr,
+            postings=self.postings, frequencies=self.frequencies,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'LexicalIndex':
+        with np.load(path) as data:
+            return cls(
+                data['ids'], data['categories'], data['category_names'].tolist(), data['lengths'],
+                data['vocabulary'], data['indptr'], data['postings'], data['frequencies'],
+            )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def category_of(self, doc_id: str) -> str:
+        return self.category_names[self.categories[self.positions[doc_id]]]
+
+    def _postings(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        i = self.term_index.get(term)
+        if i is None:
+            return None
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.postings[start:end], self.frequencies[start:end]
+
+    def _scores(self, query_terms: Iterable[str]) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(query_terms):
+            posting = self._postings(term)
+            if posting is None:
+                continue
+            docs, tf = posting[0], posting[1].astype(np.float32)
+            idf = math.log(1 + (len(self.ids) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / self.avg_length)
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def _top(self, scores: np.ndarray, category: str | None, k: int) -> list[tuple[str, float]]:
+        if category is not None:
+            if category not in self.category_names:
+                return []
+            scores[self.categories != self.category_names.index(category)] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.ids[i].item(), float(scores[i])) for i in candidates]
+
+    def search(self, query: str, category: str | None = None, k: int = 10) -> list[tuple[str, float]]:
+        """Топ-k фрагментов по BM25: (id, оценка), больше — лучше."""
+        if not len(self.ids):
+            return []
+        return self._top(self._scores([*terms(query), *identifiers(query)]), category, k)
+
+    def lookup(self, query: str, category: str | None = None, k: int = 10) -> list[tuple[str, float]] | None:
+        """Фрагменты, содержащие все обозначения стандартов из запроса, по BM25.
+
+        None — в запросе нет обозначений (нужен обычный поиск).
+        """
+        query_ids = identifiers(query)
+        if not query_ids:
+            return None
+        if not len(self.ids):
+            return []
+        mask = np.ones(len(self.ids), dtype=bool)
+        for identifier in query_ids:
+            posting = self._postings(identifier)
+            if posting is None:
+                return []
+            present = np.zeros(len(self.ids), dtype=bool)
+            present[posting[0]] = True
+            mask &= present
+        scores = self._scores([*terms(query), *query_ids])
+        scores[~mask] = 0
+        return self._top(scores, category, k)
@@ -0,0 +1,74 @@
+import httpx
+from loguru import logger
+
+from src.client.ai_chat import ChatWithAI
+from src.client.hedging import HedgedChat
+from src.config import settings
+
+
+class ProviderUnavailable(ValueError):
+    """Клиент провайдера не создан (нет учётных данных или ошибка инициализации)."""
+
+
+class LLMRegistry:
+    """Общие для процесса клиенты LLM: по одному долгоживущему клиенту на провайдера.
+
+    Клиенты переиспользуют пул keep-alive соединений, поэтому TLS-рукопожатие
+    и настройка клиента не повторяются на каждый запрос.
+    """
+
+    def __init__(self):
+        self.clients: dict[str, ChatWithAI] = {}
+        self._http_clients: list[httpx.AsyncClient] = []
+
+    async def init(self):
+        for provider in settings.LLM_PROVIDERS:
+            try:
+                self.clients[provider] = self._create(provider)
+                logger.success(f'Клиент LLM {provider} создан')
+            except Exception as e:
+                logger.exception(f'Не удалось создать клиент LLM {provider}: {e}')
+
+    def _create(self, provider: str) -> ChatWithAI:
+        http_async_client = None
+        if provider == 'deepseek':
+            http_async_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_S,
+                ),
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_S, connect=10.0),
+            )
+            self._http_clients.append(http_async_client)
+
+        return ChatWithAI(
+            provider,
+            http_async_client=http_async_client,
+            max_concurrent_streams=settings.LLM_MAX_CONCURRENT_STREAMS,
+        )
+
+    def get(self, provider: str | None = None) -> ChatWithAI | HedgedChat:
+        """Клиент провайдера; при LLM_HEDGING_ENABLED — с запасным провайдером."""
+        provider = provider or 'deepseek'
+        if provider not in self.clients:
+            raise ProviderUnavailable(f'Провайдер недоступен: {provider}')
+
+        primary = self.clients[provider]
+        secondary = next((chat for name, chat in self.clients.items() if name != provider), None)
+        if settings.LLM_HEDGING_ENABLED and secondary is not None:
+            return HedgedChat(primary, secondary, settings.LLM_HEDGE_DEADLINE_S)
+        return primary
+
+    async def close(self):
+        for client in self._http_clients:
+            await client.aclose()
+        self._http_clients.clear()
+        self.clients.clear()
+
+
+llm_registry = LLMRegistry()
+
+
+def get_llm_registry() -> LLMRegistry:
+    return llm_registry
@@ -0,0 +1,7 @@
+import unicodedata
+
+
+def normalize_query(text: str) -> str:
+    """Нормализация текста запроса для ключей кэша: регистр, ё/е, пробелы."""
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    return ' '.join(text.split())
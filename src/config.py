@@ -1,6 +1,6 @@
 import os
-import torch
-from typing import ClassVar
+from functools import lru_cache
+from typing import Literal
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,10 +12,19 @@ class Config(BaseSettings):
 
     CHROMA_PATH: str = os.path.join(BASE_DIR, "gost_database")
     COLLECTION_NAME: str = "docs"
+    # 'single' — одна коллекция с фильтром по категории, 'per_category' — коллекция на категорию.
+    COLLECTION_LAYOUT: Literal['single', 'per_category'] = 'single'
     pdf_dir: str = 'pdf/'
-    DEVICE: ClassVar[str] = "cuda" if torch.cuda.is_available() else "cpu"
 
     LM_MODEL_NAME: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    # Окно модели эмбеддингов в токенах (включая служебные): текст длиннее обрезается и в вектор не попадает.
+    EMBEDDING_MAX_TOKENS: int = 128
+    # 'torch' — fp32 через sentence-transformers, 'onnx-int8' — квантованная модель в ONNX Runtime (CPU).
+    EMBEDDING_BACKEND: Literal['torch', 'onnx-int8'] = 'torch'
+    ONNX_MODEL_DIR: str = os.path.join(BASE_DIR, "cache", "onnx")
+    # Потоки ONNX Runtime на один вызов модели. По умолчанию при поиске ядра делятся между
+    # SEARCH_WORKERS одновременными вызовами, при построении базы (один вызов за раз) — все ядра.
+    ONNX_NUM_THREADS: int | None = None
 
     GIGACHAT: str = "GigaChat" 
     GIGACHAT_CREDENTIALS: SecretStr
@@ -26,7 +35,87 @@ class Config(BaseSettings):
     HF_MODEL_NAME: str = "Vikhrmodels/Vikhr-Nemo-12B-Instruct-R-21-09-24"  
     HF_API_TOKEN: SecretStr
     
-    CHUNK_SIZE: int = 512
-    CHUNK_OVERLAP: int = 50
-    
+    # Размер и перекрытие исходных фрагментов в токенах. Фрагмент режется во второй половине
+    # окна (30–60 токенов), чтобы после объединения соседей (не длиннее EMBEDDING_MAX_TOKENS)
+    # текст целиком помещался в окно модели эмбеддингов.
+    CHUNK_SIZE: int = 60
+    CHUNK_OVERLAP: int = 10
+
+    # Параллельное извлечение текста из PDF.
+    PDF_WORKERS: int = os.cpu_count() or 1
+    # Крупные PDF делятся на задачи по столько страниц (0 — не делить).
+    PDF_PAGES_PER_TASK: int = 0
+    # Фрагменты записываются в Chroma пачками такого размера.
+    INGEST_BATCH_SIZE: int = 256
+    # Размер батча NLI-модели при объединении фрагментов (0 — последовательный режим).
+    NLI_BATCH_SIZE: int = 32
+
+    # Дедупликация фрагментов перед эмбеддингом: точные дубли по хэшу нормализованного
+    # текста и почти дубли по SimHash (расстояние Хэмминга до DEDUP_MAX_DISTANCE, не больше 3; 0 — только точные).
+    DEDUP_ENABLED: bool = True
+    DEDUP_MAX_DISTANCE: int = 3
+
+    # Постраничный кэш извлечения текста из PDF.
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_PATH: str = os.path.join(BASE_DIR, "cache", "extraction.sqlite")
+    EXTRACTION_CACHE_MAX_MB: int = 2048
+
+    # Поиск: пул потоков и микробатчинг эмбеддингов запросов.
+    SEARCH_WORKERS: int = 4
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Лексический индекс BM25 (строится вместе с базой): запросы с обозначениями стандартов
+    # («ГОСТ 2874») ищутся только по нему, остальные в режиме 'hybrid' — параллельно по BM25
+    # и векторам со слиянием RRF из LEXICAL_CANDIDATES кандидатов каждого списка.
+    SEARCH_MODE: Literal['dense', 'hybrid'] = 'hybrid'
+    LEXICAL_CANDIDATES: int = 20
+
+    # Кэш эмбеддингов запросов: LRU в памяти и необязательный уровень на диске.
+    QUERY_CACHE_SIZE: int = 10000
+    QUERY_CACHE_PATH: str | None = None
+
+    # Упаковка контекста /ask_with_ai: порог сходства фрагмента (1 - косинусное расстояние)
+    # и бюджет токенов контекста (по токенайзеру модели эмбеддингов).
+    CONTEXT_MIN_SIMILARITY: float = 0.2
+    CONTEXT_MAX_TOKENS: int = 1500
+
+    # Кэш ответов /ask_with_ai.
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_TTL_S: float = 3600
+
+    # Общие клиенты LLM: пул соединений и ограничение одновременных потоков.
+    LLM_PROVIDERS: list[str] = ['deepseek', 'gigachat']
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    LLM_KEEPALIVE_EXPIRY_S: float = 60.0
+    LLM_TIMEOUT_S: float = 120.0
+    LLM_MAX_CONCURRENT_STREAMS: int = 16
+    # Хеджирование: запасной провайдер запускается, если основной не выдал
+    # первый токен за LLM_HEDGE_DEADLINE_S секунд или упал до него.
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_DEADLINE_S: float = 2.0
+
+    # Прогон оценки (src/test/evaluate.py): одновременные вопросы и кэш контекстов и ответов.
+    EVAL_CONCURRENCY: int = 4
+    EVAL_CACHE_PATH: str = os.path.join(BASE_DIR, "cache", "evaluation.sqlite")
+
+    # Метрики стадий запроса (/metrics). Отдельные стадии можно отключить на горячем пути:
+    # embedding, chroma_query, lexical, embedding_batch, chroma_query_batch, retrieval, context_assembly, llm.
+    METRICS_ENABLED: bool = True
+    METRICS_DISABLED_STAGES: list[str] = []
+
+    @property
+    def DEVICE(self) -> str:
+        return _detect_device()
+
+
+@lru_cache(maxsize=None)
+def _detect_device() -> str:
+    # torch импортируется только при первом обращении к settings.DEVICE.
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
 settings = Config()  
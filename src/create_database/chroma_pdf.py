@@ -1,92 +1,442 @@
-# python -m src.create_database.chroma_pdf
+# python -m src.create_database.chroma_pdf [--full]
+import argparse
 import os
+import resource
+import shutil
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple
 from loguru import logger
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from ..config import settings
-from src.create_database.pdf_processing import process_pdf
-from src.create_database.semantic_chunking import merge_docs
+from src.client.embeddings import create_embeddings
+from src.client.lexical_index import LexicalIndex, lexical_index_path
+from src.create_database.dedup import DedupIndex, Fingerprint, dependents, expected_sources, fingerprint
+from src.create_database.manifest import (
+    category_collection_name, chunk_ids, file_hash, format_chunk_id, load_manifest, save_manifest,
+)
+from src.create_database.parallel_extraction import extract_pdfs
+from src.create_database.semantic_chunking import get_tokenizer, merge_docs
+from src.create_database.token_chunking import split_by_tokens
 
-def generate_chroma_db(pdf_dir: str, chunk_size: int, chunk_overlap: int):
-    
-    device = settings.DEVICE
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-        model_kwargs={"device": device},
-        encode_kwargs={"normalize_embeddings": True},
+class IngestTask(NamedTuple):
+    key: str
+    file_path: str
+    filename: str
+    category: str
+    digest: str
+    resume_from: int = 0
+
+
+class ChunkItem(NamedTuple):
+    task: IngestTask
+    index: int
+    total: int
+    document: Document | None
+    fingerprint: Fingerprint | None = None
+    # id канонического фрагмента, если этот фрагмент — его дубль.
+    duplicate_of: str | None = None
+
+
+class IndexStores:
+    """Коллекции индекса: одна общая (layout='single') или по одной на категорию ('per_category')."""
+
+    def __init__(self, embeddings, layout: str, manifest: dict):
+        self.embeddings = embeddings
+        self.layout = layout
+        self.manifest = manifest
+        self.stores: dict[str, Chroma] = {}
+
+    def for_category(self, category: str) -> Chroma:
+        if self.layout == 'per_category':
+            name = category_collection_name(category)
+            self.manifest.setdefault('collections', {})[category] = name
+        else:
+            name = settings.COLLECTION_NAME
+
+        if name not in self.stores:
+            self.stores[name] = Chroma(
+                persist_directory=settings.CHROMA_PATH,
+                embedding_function=self.embeddings,
+                collection_name=name,
+                collection_metadata={'hnsw:space': 'cosine'},
+            )
+        return self.stores[name]
+
+    def existing(self) -> list[Chroma]:
+        """Уже созданные коллекции индекса."""
+        if self.layout == 'per_category':
+            return [self.for_category(category) for category in list(self.manifest.get('collections', {}))]
+        return [self.for_category(None)]
+
+    def persist(self):
+        for store in self.stores.values():
+            store.persist()
+
+
+def build_documents(full_text: str, filename: str, category: str,
+                    chunk_size: int, chunk_overlap: int) -> list[Document]:
+    """Разбиение текста PDF на фрагменты по токенам и их семантическое объединение."""
+    if not full_text.strip():
+        return []
+
+    raw_documents = [
+        Document(page_content=chunk, metadata={"source": filename, "category": category, "tokens": tokens})
+        for chunk, tokens in split_by_tokens(full_text, get_tokenizer(), chunk_size, chunk_overlap)
+    ]
+
+    return merge_docs(raw_documents, batch_size=settings.NLI_BATCH_SIZE)
+
+
+def iter_chunks(tasks: list[IngestTask], chunk_size: int, chunk_overlap: int,
+                stats: dict) -> Iterator[ChunkItem]:
+    """Извлечение -> разбиение -> объединение, по одному файлу за раз.
+
+    Уже записанные фрагменты прерванного файла (resume_from) пропускаются.
+    Для пустого файла выдаётся один элемент без документа, чтобы отметить его обработанным.
+    """
+    extracted = extract_pdfs(
+        (task.file_path for task in tasks), digests={task.file_path: task.digest for task in tasks},
     )
 
-    texts, metadatas, ids = [], [], []
+    for task, (_, full_text) in zip(tasks, extracted):
+        if full_text is None:
+            stats['failed'] += 1
+            continue
+
+        logger.info(f"Обработка: {task.category}/{task.filename}")
+        documents = build_documents(full_text, task.filename, task.category, chunk_size, chunk_overlap)
+        if not documents:
+            yield ChunkItem(task, 0, 0, None)
+            continue
+
+        for i in range(task.resume_from, len(documents)):
+            yield ChunkItem(task, i, len(documents), documents[i])
+
+
+def dedup_chunks(items: Iterable[ChunkItem], index: DedupIndex) -> Iterator[ChunkItem]:
+    """Стадия дедупликации: дубли помечаются ссылкой на канонический фрагмент и не эмбеддятся."""
+    for item in items:
+        if item.document is None:
+            yield item
+            continue
+
+        fp = fingerprint(item.document.page_content)
+        canonical, kind = index.find(item.task.category, fp)
+        if canonical is None:
+            index.add(format_chunk_id(item.task.category, item.task.filename, item.index), item.task.category, fp, item.task.filename)
+            yield item._replace(fingerprint=fp)
+        else:
+            index.record(kind, item.document.page_content)
+            yield item._replace(duplicate_of=canonical)
+
+
+def load_dedup_index(stores: IndexStores, page_size: int = 5000) -> DedupIndex:
+    """Индекс дедупликации по уже записанным фрагментам (постранично)."""
+    index = DedupIndex(settings.DEDUP_MAX_DISTANCE)
+    for store in stores.existing():
+        offset = 0
+        while True:
+            page = store._collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            index.load(page['ids'], page['metadatas'])
+            if len(page['ids']) < page_size:
+                break
+            offset += page_size
+    return index
+
+
+def sync_sources(stores: IndexStores, index: DedupIndex, files: dict) -> int:
+    """Запись в метаданные канонических фрагментов списка всех их источников."""
+    updates: dict[str, tuple[list, list]] = {}
+    for chunk_id, sources in expected_sources(files, index).items():
+        if sources != index.stored_sources[chunk_id]:
+            ids, metadatas = updates.setdefault(index.categories[chunk_id], ([], []))
+            ids.append(chunk_id)
+            metadatas.append({'sources': sources})
+            index.stored_sources[chunk_id] = sources
+
+    for category, (ids, metadatas) in updates.items():
+        stores.for_category(category)._collection.update(ids=ids, metadatas=metadatas)
+    return sum(len(ids) for ids, _ in updates.values())
+
+
+def build_lexical_index(stores: IndexStores, page_size: int = 5000) -> LexicalIndex:
+    """Индекс BM25 по всем записанным фрагментам (постранично, блоками LexicalIndex.from_documents)."""
+    def documents():
+        for store in stores.existing():
+            offset = 0
+            while True:
+                page = store._collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+                for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                    yield chunk_id, text, metadata.get('category')
+                if len(page['ids']) < page_size:
+                    break
+                offset += page_size
+
+    return LexicalIndex.from_documents(documents())
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
 
-    if os.path.exists(settings.CHROMA_PATH):
-        import shutil
-        logger.info("Удаляется старая база данных...")
-        shutil.rmtree(settings.CHROMA_PATH)
+
+def update_lexical_index(stores: IndexStores, previous: LexicalIndex | None, removed: set[str],
+                         blocks: list[LexicalIndex]) -> LexicalIndex:
+    """Индекс BM25 после запуска: из прежнего удаляются фрагменты removed, добавляются блоки
+    записанных фрагментов.
+
+    Если прежнего индекса нет (в том числе после прерванной сборки) или итог
+    не совпадает с базой по числу фрагментов, индекс строится заново по всем
+    фрагментам.
+    """
+    stored = sum(store._collection.count() for store in stores.existing())
+    if previous is not None:
+        lexical = LexicalIndex.merge([previous.without(removed), *blocks])
+        if len(lexical) == stored:
+            return lexical
+        logger.warning(f"Лексический индекс ({len(lexical)} фрагментов) не совпадает с базой ({stored}), пересборка")
+    return build_lexical_index(stores)
+
+
+def write_batch(stores: IndexStores, batch: list[ChunkItem], manifest: dict) -> list[ChunkItem]:
+    """Запись пачки фрагментов и фиксация прогресса в манифесте (контрольная точка).
+
+    Возвращает записанные фрагменты (без дублей и пустых).
+    """
+    items = [item for item in batch if item.document is not None and item.duplicate_of is None]
+
+    by_category: dict[str, list[ChunkItem]] = {}
+    for item in items:
+        by_category.setdefault(item.task.category, []).append(item)
+
+    for category, category_items in by_category.items():
+        stores.for_category(category).add_texts(
+            texts=[item.document.page_content for item in category_items],
+            metadatas=[
+                {
+                    "source": item.task.filename, "category": item.task.category, "chunk": item.index,
+                    **({"sources": item.task.filename, **item.fingerprint.metadata()} if item.fingerprint else {}),
+                }
+                for item in category_items
+            ],
+            ids=[format_chunk_id(item.task.category, item.task.filename, item.index) for item in category_items],
+        )
+
+    for item in batch:
+        committed = item.index + 1 if item.document is not None else 0
+        previous = manifest['files'].get(item.task.key) or {}
+        # Дубли файла: номер фрагмента -> id канонического фрагмента.
+        duplicates = previous.get('duplicates', {}) if previous.get('hash') == item.task.digest else {}
+        if item.duplicate_of is not None:
+            duplicates[str(item.index)] = item.duplicate_of
+
+        entry = {
+            'hash': item.task.digest,
+            'category': item.task.category,
+            'source': item.task.filename,
+            'chunks': committed,
+            'complete': committed == item.total,
+        }
+        if duplicates:
+            entry['duplicates'] = duplicates
+        manifest['files'][item.task.key] = entry
+    save_manifest(manifest)
+    return items
+
+
+def peak_rss_mb() -> tuple[float, float]:
+    """Пиковый RSS, МБ: основного процесса и самого большого из завершённых дочерних.
+
+    Это отдельные пики, не общий: ОС не сообщает суммарный пик процесса и воркеров,
+    а сумма этих чисел не является ни им, ни его оценкой сверху.
+    """
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def generate_chroma_db(pdf_dir: str, chunk_size: int, chunk_overlap: int, full: bool = False,
+                       batch_size: int | None = None, layout: str | None = None,
+                       embeddings: Embeddings | None = None):
+    """Инкрементальное потоковое построение базы.
+
+    Повторно обрабатываются только новые и изменённые PDF (по sha256 содержимого),
+    фрагменты удалённых и изменённых файлов удаляются из коллекции.
+    При full=True или смене параметров разбиения база пересоздаётся полностью.
+
+    Фрагменты пишутся в Chroma пачками по batch_size, после каждой пачки
+    прогресс сохраняется в манифест, поэтому прерванная сборка продолжается
+    с последней записанной пачки. Из текстов в памяти одновременно находятся
+    не более 2 * PDF_WORKERS извлечённых PDF, фрагменты одного файла и одна
+    пачка. С размером корпуса растут только индексы по всем фрагментам:
+    отпечатки дедупликации (при DEDUP_ENABLED) и массивы лексического индекса
+    (несколько байт на вхождение терма, без текстов).
+
+    layout='per_category' строит отдельную коллекцию на каждую папку-категорию
+    (по умолчанию — settings.COLLECTION_LAYOUT). embeddings — модель эмбеддингов
+    вместо create_embeddings() (для бенчмарков).
+
+    При DEDUP_ENABLED дубли фрагментов в пределах категории не эмбеддятся:
+    у канонического фрагмента в метаданных 'sources' перечислены все файлы,
+    где он встречается.
+
+    Лексический индекс BM25 (lexical_index.npz) обновляется инкрементально:
+    удаляются фрагменты удалённых и изменённых файлов, добавляются записанные
+    в этом запуске. На время запуска индекс помечается в манифесте
+    несинхронизированным ('lexical': None); без сохранённого индекса или после
+    прерванного запуска он строится по всем фрагментам.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    layout = layout or settings.COLLECTION_LAYOUT
+    embeddings = embeddings or create_embeddings()
 
     if not os.path.exists(pdf_dir):
         raise FileNotFoundError(f"Директория не найдена: {pdf_dir}")
-    
+
+    params = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "max_merged_tokens": settings.EMBEDDING_MAX_TOKENS,
+        "model_name": settings.LM_MODEL_NAME,
+        "embedding_backend": settings.EMBEDDING_BACKEND,
+        "nli_batched": bool(settings.NLI_BATCH_SIZE),
+        "chunker": "tokens",
+        # Схема id фрагментов: при её смене база пересобирается.
+        "chunk_ids": "category/source_chunk",
+        "layout": layout,
+        "dedup": settings.DEDUP_MAX_DISTANCE if settings.DEDUP_ENABLED else None,
+    }
+    manifest = load_manifest()
+
+    if full or manifest['params'] != params:
+        if os.path.exists(settings.CHROMA_PATH):
+            logger.info("Удаляется старая база данных...")
+            shutil.rmtree(settings.CHROMA_PATH)
+        manifest = {'params': params, 'files': {}, 'collections': {}}
+
+    stores = IndexStores(embeddings, layout, manifest)
+    # Сохранённый индекс BM25 годится для обновления, только если в манифесте
+    # отмечено, что он записан после последнего изменения коллекций.
+    if not manifest['files']:
+        lexical_previous = LexicalIndex.from_documents([])
+    elif manifest.get('lexical') and os.path.exists(lexical_index_path()):
+        lexical_previous = LexicalIndex.load(lexical_index_path())
+    else:
+        lexical_previous = None
+    # До первого изменения коллекций: если запуск прервётся, индекс будет пересобран.
+    manifest['lexical'] = None
+    save_manifest(manifest)
+
     categories = [d for d in os.listdir(pdf_dir)]
     logger.info(f'Найдены категории: {categories}')
 
+    on_disk: dict[str, IngestTask] = {}
     for category in categories:
         folder_path = os.path.join(pdf_dir, category)
-        logger.info(f'Начата обработка категории: {category}')
 
-        for filename in os.listdir(folder_path):
+        for filename in sorted(os.listdir(folder_path)):
             if not filename.lower().endswith('.pdf'):
                 continue
 
             file_path = os.path.join(folder_path, filename)
-            logger.info(f"Обработка: {filename}")
+            key = os.path.join(category, filename)
+            on_disk[key] = IngestTask(key, file_path, filename, category, file_hash(file_path))
 
-            full_text = process_pdf(file_path)
-            if not full_text.strip():
-                continue
+    # Удалённые и изменённые файлы, а при дедупликации — и файлы, чьи дубли
+    # ссылались на их фрагменты: такие файлы обрабатываются заново.
+    files = manifest['files']
+    stale = {key for key, entry in files.items() if key not in on_disk or on_disk[key].digest != entry['hash']}
+    affected = dependents(files, stale) if settings.DEDUP_ENABLED else set()
+    removed: set[str] = set()
+    for key in sorted(stale | affected):
+        entry = files.pop(key)
+        removed.update(chunk_ids(entry['category'], entry['source'], entry['chunks']))
+        if key not in on_disk:
+            logger.info(f"Удалён: {entry['source']}")
+        elif key in stale:
+            logger.info(f"Изменён: {entry['source']}")
+        else:
+            logger.info(f"Канонический фрагмент изменён, повторная обработка: {entry['source']}")
+        stores.for_category(entry['category']).delete(ids=chunk_ids(entry['category'], entry['source'], entry['chunks']))
 
-            raw_chunks = []
-            for i in range(0, len(full_text), chunk_size - chunk_overlap):
-                chunk = full_text[i:i + chunk_size]
-                if len(chunk) < chunk_size and i > 0:
-                    break
-                raw_chunks.append(chunk.strip())
-
-            raw_documents = [
-                Document(page_content=chunk, metadata={"source": filename, "category": category})
-                for chunk in raw_chunks if chunk
-            ]
-
-            merged_documents = merge_docs(raw_documents)
-
-            for i, doc in enumerate(merged_documents):
-                texts.append(doc.page_content)
-                metadatas.append({
-                    "source": filename,
-                    "category": category,
-                    "chunk": i
-                })
-                ids.append(f"{filename}_{i}")
-
-    logger.info(f"Всего {len(texts)} фрагментов")
-
-
-    chroma_db = Chroma.from_texts(
-        texts=texts,
-        embedding=embeddings,
-        metadatas=metadatas,
-        ids=ids,
-        persist_directory=settings.CHROMA_PATH,
-        collection_name=settings.COLLECTION_NAME,
+    tasks = []
+    skipped = 0
+    for key, task in on_disk.items():
+        entry = files.get(key)
+        if entry is None:
+            tasks.append(task)
+        elif entry.get('complete', True):
+            skipped += 1
+        else:
+            logger.info(f"Продолжение: {task.filename} с фрагмента {entry['chunks']}")
+            tasks.append(task._replace(resume_from=entry['chunks']))
+
+    logger.info(f'К обработке {len(tasks)} файлов, без изменений {skipped}')
+
+    index = load_dedup_index(stores) if settings.DEDUP_ENABLED else None
+    stats = {'failed': 0}
+    added = 0
+    chunks = iter_chunks(tasks, chunk_size, chunk_overlap, stats)
+    if index is not None:
+        chunks = dedup_chunks(chunks, index)
+    lexical_blocks = []
+    for batch in batched(chunks, batch_size):
+        written = write_batch(stores, batch, manifest)
+        added += len(written)
+        if lexical_previous is not None:
+            lexical_blocks.append(LexicalIndex.from_documents(
+                (format_chunk_id(item.task.category, item.task.filename, item.index), item.document.page_content,
+                 item.task.category)
+                for item in written
+            ))
+        logger.debug(f"Записано {added} фрагментов")
+
+    if index is not None:
+        updated = sync_sources(stores, index, files)
+        logger.info(
+            f"Дедупликация: пропущено {index.stats['exact'] + index.stats['near']} фрагментов "
+            f"({index.stats['exact']} точных и {index.stats['near']} почти дублей), "
+            f"{index.stats['bytes'] / 1024:.1f} КБ текста; обновлены источники у {updated} фрагментов"
+        )
+
+    lexical = update_lexical_index(stores, lexical_previous, removed, lexical_blocks)
+    lexical.save(lexical_index_path())
+    logger.info(
+        f"Лексический индекс: {len(lexical)} фрагментов, {len(lexical.vocabulary)} термов, "
+        f"{lexical.nbytes / 2 ** 20:.1f} МБ"
+    )
+
+    manifest['lexical'] = {'chunks': len(lexical)}
+    save_manifest(manifest)
+    stores.persist()
+    logger.info(f"Добавлено {added} фрагментов, пропущено без изменений {skipped} файлов.")
+    if stats['failed']:
+        logger.warning(f"Не удалось обработать {stats['failed']} файлов, они будут повторены при следующем запуске.")
+    main_rss, worker_rss = peak_rss_mb()
+    workers = (f"самый большой воркер извлечения {worker_rss:.0f} МБ" if worker_rss
+               else "воркеров извлечения не было")
+    logger.info(
+        f"Пиковый RSS (отдельно, не сумма): основной процесс {main_rss:.0f} МБ, {workers}. Текстов в памяти не более "
+        f"{2 * settings.PDF_WORKERS} извлечённых PDF и пачки из {batch_size} фрагментов; с корпусом растут "
+        f"индексы дедупликации и лексический ({lexical.nbytes / 2 ** 20:.1f} МБ)"
     )
-    chroma_db.persist()
-    logger.info("База создана.")
-    return chroma_db
+    logger.info("База обновлена.")
+    return stores
 
 
 if __name__ == "__main__":
-    generate_chroma_db('pdf/', 
-                       chunk_size=settings.CHUNK_SIZE, 
-                       chunk_overlap = settings.CHUNK_OVERLAP)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Построение базы ГОСТов")
+    parser.add_argument('--full', action='store_true', help="Полная пересборка базы")
+    parser.add_argument('--layout', choices=['single', 'per_category'],
+                        help="Одна коллекция или коллекция на категорию")
+    args = parser.parse_args()
+
+    generate_chroma_db('pdf/',
+                       chunk_size=settings.CHUNK_SIZE,
+                       chunk_overlap = settings.CHUNK_OVERLAP,
+                       full=args.full,
+                       layout=args.layout)
@@ -0,0 +1,151 @@
+import hashlib
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+from src.client.normalization import normalize_query
+from src.create_database.manifest import chunk_ids
+
+
+# Разделитель списка источников канонического фрагмента в метаданных
+# (Chroma хранит в метаданных только скалярные значения).
+SOURCES_SEPARATOR = '; '
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+SHINGLE_SIZE = 3
+
+_WORD = re.compile(r'\w+')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def content_hash(text: str) -> str:
+    """Хэш нормализованного текста: совпадает у точных дублей."""
+    return hashlib.sha1(normalize_query(text).encode('utf-8')).hexdigest()
+
+
+def numbers_hash(text: str) -> str:
+    """Хэш чисел фрагмента по порядку.
+
+    Почти дублями считаются только фрагменты с одинаковыми числами: в ГОСТах
+    таблицы норм для разных продуктов часто отличаются только значениями.
+    """
+    numbers = _NUMBER.findall(text.replace(',', '.'))
+    return hashlib.sha1(' '.join(numbers).encode('utf-8')).hexdigest()[:16]
+
+
+def simhash(text: str) -> int:
+    """64-битный SimHash по шинглам из трёх слов нормализованного текста."""
+    words = _WORD.findall(normalize_query(text))
+    shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little') for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(hashes)
+    return sum(1 << int(i) for i in np.flatnonzero(votes > 0))
+
+
+class Fingerprint(NamedTuple):
+    content_hash: str
+    simhash: int
+    numbers_hash: str
+
+    def metadata(self) -> dict:
+        # simhash — строкой: в Chroma целые числа знаковые 64-битные.
+        return {'content_hash': self.content_hash, 'simhash': f'{self.simhash:016x}', 'numbers_hash': self.numbers_hash}
+
+
+def fingerprint(text: str) -> Fingerprint:
+    return Fingerprint(content_hash(text), simhash(text), numbers_hash(text))
+
+
+def _bands(value: int) -> list[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+class DedupIndex:
+    """Канонические фрагменты для дедупликации, отдельно по категориям.
+
+    Точные дубли ищутся по хэшу нормализованного текста, почти дубли — по SimHash
+    с расстоянием Хэмминга не больше max_distance. Кандидаты отбираются по 4 полосам
+    по 16 бит: при расстоянии до 3 хотя бы одна полоса совпадает.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        if not 0 <= max_distance < BANDS:
+            raise ValueError(f'max_distance должен быть от 0 до {BANDS - 1}')
+        self.max_distance = max_distance
+        self.exact: dict[tuple[str, str], str] = {}
+        self.bands: dict[tuple, list[tuple[int, str]]] = {}
+        # id канонического фрагмента -> категория и записанный в метаданные список источников.
+        self.categories: dict[str, str] = {}
+        self.stored_sources: dict[str, str] = {}
+        self.stats = {'exact': 0, 'near': 0, 'bytes': 0}
+
+    def add(self, chunk_id: str, category: str, fp: Fingerprint, sources: str):
+        self.exact.setdefault((category, fp.content_hash), chunk_id)
+        if self.max_distance:
+            for i, band in enumerate(_bands(fp.simhash)):
+                self.bands.setdefault((category, fp.numbers_hash, i, band), []).append((fp.simhash, chunk_id))
+        self.categories[chunk_id] = category
+        self.stored_sources[chunk_id] = sources
+
+    def find(self, category: str, fp: Fingerprint) -> tuple[str | None, str | None]:
+        """Канонический фрагмент для дубля и вид совпадения ('exact' | 'near')."""
+        chunk_id = self.exact.get((category, fp.content_hash))
+        if chunk_id is not None:
+            return chunk_id, 'exact'
+        if self.max_distance:
+            for i, band in enumerate(_bands(fp.simhash)):
+                for candidate, chunk_id in self.bands.get((category, fp.numbers_hash, i, band), ()):
+                    if (candidate ^ fp.simhash).bit_count() <= self.max_distance:
+                        return chunk_id, 'near'
+        return None, None
+
+    def record(self, kind: str, text: str):
+        self.stats[kind] += 1
+        self.stats['bytes'] += len(text.encode('utf-8'))
+
+    def load(self, ids: list[str], metadatas: list[dict]):
+        """Загрузка уже записанных в коллекцию канонических фрагментов."""
+        for chunk_id, metadata in zip(ids, metadatas):
+            if metadata and 'content_hash' in metadata:
+                fp = Fingerprint(metadata['content_hash'], int(metadata['simhash'], 16), metadata['numbers_hash'])
+                self.add(chunk_id, metadata['category'], fp, metadata.get('sources', metadata['source']))
+
+
+def dependents(files: dict, stale: set[str]) -> set[str]:
+    """Файлы, чьи дубли ссылаются на фрагменты устаревших файлов, — транзитивно."""
+    result = set()
+    worklist = list(stale)
+    while worklist:
+        entry = files[worklist.pop()]
+        owned = set(chunk_ids(entry['category'], entry['source'], entry['chunks']))
+        for key, other in files.items():
+            if key in stale or key in result or other['category'] != entry['category']:
+                continue
+            if owned & set(other.get('duplicates', {}).values()):
+                result.add(key)
+                worklist.append(key)
+    return result
+
+
+def expected_sources(files: dict, index: DedupIndex) -> dict[str, str]:
+    """Список источников каждого канонического фрагмента по манифесту."""
+    sources: dict[str, list[str]] = {}
+    for entry in files.values():
+        for chunk_id in entry.get('duplicates', {}).values():
+            if chunk_id in index.categories and entry['source'] not in sources.setdefault(chunk_id, []):
+                sources[chunk_id].append(entry['source'])
+
+    result = {}
+    for chunk_id, stored in index.stored_sources.items():
+        owner = stored.split(SOURCES_SEPARATOR)[0]
+        others = sorted(s for s in sources.get(chunk_id, []) if s != owner)
+        result[chunk_id] = SOURCES_SEPARATOR.join([owner, *others])
+    return result
@@ -0,0 +1,152 @@
+# python -m src.create_database.extraction_cache stats|clear
+import argparse
+import os
+import sqlite3
+import time
+from functools import lru_cache
+from typing import Iterable
+
+from loguru import logger
+
+from src.config import settings
+
+# Строка с этим индексом хранит число страниц документа.
+PAGE_COUNT_INDEX = -1
+
+
+class ExtractionCache:
+    """Постраничный кэш результатов process_pdf на диске (SQLite).
+
+    Ключ — sha256 PDF, индекс страницы и версия извлечения. Значение — итоговый
+    текст страницы с таблицами в markdown, NULL — страница пропущена
+    (титульный лист, содержание). При превышении max_bytes вытесняются
+    давно не использованные записи.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            '''CREATE TABLE IF NOT EXISTS pages (
+                pdf_hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                text TEXT,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (pdf_hash, page, version)
+            )'''
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)')
+        self.conn.commit()
+
+    def get_page_count(self, pdf_hash: str, version: str) -> int | None:
+        row = self.conn.execute(
+            'SELECT text FROM pages WHERE pdf_hash = ? AND page = ? AND version = ?',
+            (pdf_hash, PAGE_COUNT_INDEX, version),
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    def get_many(self, pdf_hash: str, pages: Iterable[int], version: str) -> dict[int, str | None]:
+        """Закэшированные страницы документа: индекс -> текст (None — страница пропущена)."""
+        pages = list(pages)
+        rows = self.conn.execute(
+            'SELECT page, text FROM pages WHERE pdf_hash = ? AND version = ? AND page >= 0',
+            (pdf_hash, version),
+        ).fetchall()
+        wanted = set(pages)
+        found = {page: text for page, text in rows if page in wanted}
+        if found:
+            with self.conn:
+                self.conn.execute(
+                    'UPDATE pages SET accessed = ? WHERE pdf_hash = ? AND version = ?',
+                    (time.time(), pdf_hash, version),
+                )
+        return found
+
+    def put_many(self, pdf_hash: str, pages: dict[int, str | None], version: str,
+                 page_count: int | None = None):
+        now = time.time()
+        rows = [
+            (pdf_hash, page, version, text, len(text.encode('utf-8')) if text else 0, now)
+            for page, text in pages.items()
+        ]
+        if page_count is not None:
+            rows.append((pdf_hash, PAGE_COUNT_INDEX, version, str(page_count), 0, now))
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self.evict()
+
+    def size(self) -> int:
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def evict(self):
+        """Вытеснение давно не использованных документов до 90% лимита."""
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute(
+            '''SELECT pdf_hash, version, SUM(size) FROM pages
+               GROUP BY pdf_hash, version ORDER BY MAX(accessed)'''
+        ).fetchall()
+        evicted = []
+        for pdf_hash, version, size in rows:
+            if total <= target:
+                break
+            evicted.append((pdf_hash, version))
+            total -= size
+        with self.conn:
+            self.conn.executemany('DELETE FROM pages WHERE pdf_hash = ? AND version = ?', evicted)
+        logger.debug(f'Кэш извлечения: вытеснено документов {len(evicted)}')
+
+    def stats(self) -> dict:
+        documents, pages, size = self.conn.execute(
+            '''SELECT COUNT(DISTINCT pdf_hash || version),
+                      COALESCE(SUM(page >= 0), 0), COALESCE(SUM(size), 0) FROM pages'''
+        ).fetchone()
+        versions = [row[0] for row in self.conn.execute('SELECT DISTINCT version FROM pages')]
+        return {
+            'path': self.path,
+            'documents': documents,
+            'pages': pages,
+            'size_mb': size / 2**20,
+            'max_mb': self.max_bytes / 2**20,
+            'versions': versions,
+        }
+
+    def clear(self, pdf_hash: str | None = None):
+        with self.conn:
+            if pdf_hash:
+                self.conn.execute('DELETE FROM pages WHERE pdf_hash = ?', (pdf_hash,))
+            else:
+                self.conn.execute('DELETE FROM pages')
+        self.conn.execute('VACUUM')
+
+
+@lru_cache(maxsize=None)
+def get_extraction_cache() -> ExtractionCache:
+    """Кэш открывается один раз на процесс (в том числе в каждом процессе пула извлечения)."""
+    return ExtractionCache(settings.EXTRACTION_CACHE_PATH, settings.EXTRACTION_CACHE_MAX_MB * 2**20)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Кэш извлечения текста из PDF")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="Показать размер и содержимое кэша")
+    clear_parser = subparsers.add_parser('clear', help="Очистить кэш")
+    clear_parser.add_argument('--pdf', help="sha256 документа, по умолчанию — весь кэш")
+    args = parser.parse_args()
+
+    cache = get_extraction_cache()
+    if args.command == 'stats':
+        for name, value in cache.stats().items():
+            print(f'{name}: {value:.1f}' if isinstance(value, float) else f'{name}: {value}')
+    elif args.command == 'clear':
+        cache.clear(args.pdf)
+        print('Кэш очищен')
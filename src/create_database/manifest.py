@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+from src.config import settings
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def manifest_path(chroma_path: str = None) -> str:
+    return os.path.join(chroma_path or settings.CHROMA_PATH, MANIFEST_NAME)
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """sha256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(chroma_path: str = None) -> dict:
+    """Загрузка манифеста базы. Если его нет — пустой манифест."""
+    path = manifest_path(chroma_path)
+    if not os.path.exists(path):
+        return {'params': None, 'files': {}, 'collections': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, chroma_path: str = None):
+    """Атомарная запись манифеста (через временный файл)."""
+    path = manifest_path(chroma_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def index_version(chroma_path: str = None) -> str:
+    """Версия индекса: хэш манифеста (параметры сборки и содержимое файлов)."""
+    manifest = load_manifest(chroma_path)
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def category_collection_name(category: str) -> str:
+    """Имя коллекции категории: Chroma допускает только латиницу, поэтому — хэш названия."""
+    return f"{settings.COLLECTION_NAME}-{hashlib.sha1(category.encode('utf-8')).hexdigest()[:16]}"
+
+
+def format_chunk_id(category: str, filename: str, index: int) -> str:
+    """id фрагмента в коллекции. Категория входит в id: одноимённые PDF бывают в разных
+    категориях, а при раскладке 'single' они лежат в одной коллекции."""
+    return f"{category}/{filename}_{index}"
+
+
+def chunk_ids(category: str, filename: str, count: int) -> list[str]:
+    """id фрагментов файла в коллекции."""
+    return [format_chunk_id(category, filename, i) for i in range(count)]
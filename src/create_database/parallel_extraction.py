@@ -0,0 +1,137 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Mapping
+
+from loguru import logger
+
+from src.config import settings
+from src.create_database.pdf_processing import count_pages, extract_pages
+
+
+def _page_ranges(pdf_path: str, pages_per_task: int) -> list[range | None]:
+    """Деление PDF на диапазоны страниц (None — документ целиком)."""
+    if pages_per_task <= 0:
+        return [None]
+    n_pages = count_pages(pdf_path)
+    if n_pages <= pages_per_task:
+        return [None]
+    return [range(start, min(start + pages_per_task, n_pages))
+            for start in range(0, n_pages, pages_per_task)]
+
+
+def _submit(executor: ProcessPoolExecutor, pdf_path: str, pages_per_task: int,
+            digest: str | None) -> list[Future] | None:
+    try:
+        ranges = _page_ranges(pdf_path, pages_per_task)
+    except Exception as e:
+        logger.error(f'Не удалось открыть {pdf_path}: {e}')
+        return None
+    return [executor.submit(extract_pages, pdf_path, pages, digest) for pages in ranges]
+
+
+def _extract_inline(pdf_path: str, digest: str | None) -> str | None:
+    try:
+        return "\n".join(extract_pages(pdf_path, pdf_hash=digest))
+    except Exception as e:
+        logger.error(f'Ошибка извлечения {pdf_path}: {e}')
+        return None
+
+
+def _completed(futures: list[Future]) -> bool:
+    """Задачи файла доработали до падения пула (их результат или ошибка уже известны)."""
+    return all(
+        f.done() and not f.cancelled() and not isinstance(f.exception(), BrokenProcessPool)
+        for f in futures
+    )
+
+
+def _extract_alone(pdf_path: str, pages_per_task: int, digest: str | None) -> str | None:
+    """Повторное извлечение в отдельном однопроцессном пуле.
+
+    Падение здесь — вина именно этого файла, и только тогда он считается необработанным.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        futures = _submit(executor, pdf_path, pages_per_task, digest)
+        if futures is None:
+            return None
+        try:
+            return "\n".join(page for f in futures for page in f.result())
+        except BrokenProcessPool as e:
+            logger.error(f'Процесс извлечения аварийно завершился на {pdf_path}: {e}')
+        except Exception as e:
+            logger.error(f'Ошибка извлечения {pdf_path}: {e}')
+    return None
+
+
+def extract_pdfs(paths: Iterable[str], max_workers: int | None = None,
+                 pages_per_task: int | None = None,
+                 digests: Mapping[str, str] | None = None) -> Iterator[tuple[str, str | None]]:
+    """Параллельное извлечение текста из PDF в пуле процессов.
+
+    Возвращает пары (путь, текст) строго в порядке входных путей, поэтому id
+    фрагментов остаются стабильными. Для файлов, на которых упал обработчик,
+    вместо текста возвращается None. digests — уже посчитанные sha256 файлов
+    (путь -> хэш) для ключа кэша извлечения.
+
+    При аварийном завершении процесса пула виновник неизвестен: все
+    незавершённые файлы окна повторяются по одному в отдельном процессе,
+    и необработанным помечается только тот, что падает и в одиночку.
+    """
+    max_workers = max_workers or settings.PDF_WORKERS
+    digests = digests or {}
+    if pages_per_task is None:
+        pages_per_task = settings.PDF_PAGES_PER_TASK
+
+    if max_workers <= 1:
+        for path in paths:
+            yield path, _extract_inline(path, digests.get(path))
+        return
+
+    paths = iter(paths)
+    window = max_workers * 2
+    # (путь, задачи или None, если PDF не открылся, повторять ли файл отдельно)
+    pending: deque[tuple[str, list[Future] | None, bool]] = deque()
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    try:
+        while True:
+            while len(pending) < window:
+                path = next(paths, None)
+                if path is None:
+                    break
+                pending.append((path, _submit(executor, path, pages_per_task, digests.get(path)), False))
+
+            if not pending:
+                break
+
+            path, futures, isolated = pending.popleft()
+            if isolated:
+                yield path, _extract_alone(path, pages_per_task, digests.get(path))
+                continue
+
+            text = None
+            if futures is not None:
+                try:
+                    text = "\n".join(page for f in futures for page in f.result())
+                except BrokenProcessPool as e:
+                    # Процесс упал целиком (например, segfault в парсере) — пул
+                    # пересоздаётся, незавершённые файлы повторяются по одному.
+                    pending.appendleft((path, futures, False))
+                    pending = deque(
+                        (p, f, isolated or (f is not None and not _completed(f)))
+                        for p, f, isolated in pending
+                    )
+                    logger.error(
+                        f'Процесс извлечения аварийно завершился ({e}); '
+                        f'{sum(isolated for _, _, isolated in pending)} незавершённых файлов будут повторены по одному'
+                    )
+                    executor.shutdown(cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=max_workers)
+                    continue
+                except Exception as e:
+                    logger.error(f'Ошибка извлечения {path}: {e}')
+
+            yield path, text
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -1,53 +1,128 @@
+import numpy as np
 import pdfplumber
 import pandas as pd
-from pdfplumber.utils import extract_text, get_bbox_overlap, obj_to_bbox
+from pdfplumber.utils import clip_obj, extract_text, get_bbox_overlap, obj_to_bbox
 
-def process_pdf(pdf_path):
-    pdf = pdfplumber.open(pdf_path)
-    all_text = []
+from src.config import settings
+from src.create_database.extraction_cache import get_extraction_cache
+from src.create_database.manifest import file_hash
 
-    for page in pdf.pages:
-        page = page.crop(page.bbox)
-        page_text_full = page.extract_text()
+# Версия логики извлечения: входит в ключ кэша, повышать при изменении process_page.
+EXTRACTOR_VERSION = '1'
 
-        # Игнорирование титульной страницы и содержания. 
-        if "Издание официальное" in (page_text_full or "") or 'Содержание' in (page_text_full or ""):
-            continue  
 
-        filtered_page = page
-        chars = filtered_page.chars
+def count_pages(pdf_path) -> int:
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
 
-        for table in page.find_tables():
-            table_data = table.extract()
-            table_data = [[cell if cell is not None else "" for cell in row] for row in table_data]
 
-            df = pd.DataFrame(table_data)
-            if len(df) == 0:
-                continue
+def bbox_overlaps(bboxes: np.ndarray, bbox) -> np.ndarray:
+    """Векторный аналог `get_bbox_overlap(obj_bbox, bbox) is not None` для массива (N, 4)."""
+    width = np.minimum(bboxes[:, 2], bbox[2]) - np.maximum(bboxes[:, 0], bbox[0])
+    height = np.minimum(bboxes[:, 3], bbox[3]) - np.maximum(bboxes[:, 1], bbox[1])
+    return (width >= 0) & (height >= 0) & (width + height > 0)
 
-            df.columns = df.iloc[0]
-            markdown = df.drop(0).to_markdown(index=False)
 
-            filtered_page = filtered_page.filter(lambda obj:
-                get_bbox_overlap(obj_to_bbox(obj), table.bbox) is None
-            )
-            chars = filtered_page.chars
+def replace_table_chars(chars: list[dict], tables: list[tuple[tuple, str]]) -> list[dict]:
+    """Замена символов таблиц их markdown-представлением.
 
-            first_table_char = page.crop(table.bbox).chars[0]
-            chars.append({
-                **first_table_char,
-                "text": markdown
-            })
+    Символы, попадающие в bbox любой таблицы, удаляются за один проход по
+    массиву координат; на место таблицы ставится один символ с текстом markdown
+    (координаты — первого символа таблицы, обрезанные по её bbox).
+    """
+    bboxes = np.array(
+        [(char['x0'], char['top'], char['x1'], char['bottom']) for char in chars], dtype=float,
+    ).reshape(-1, 4)
+    keep = np.ones(len(chars), dtype=bool)
+    table_chars = []
 
-        page_text = extract_text(chars, layout=True)
+    for bbox, markdown in tables:
+        in_table = bbox_overlaps(bboxes, bbox)
+        keep &= ~in_table
 
-        if "Библиография" in page_text:
-            page_text = page_text[: page_text.find("Библиография")].strip()
+        # Markdown предыдущей таблицы, перекрытый следующей, удаляется вместе с ней.
+        table_chars = [
+            char for char in table_chars if get_bbox_overlap(obj_to_bbox(char), bbox) is None
+        ]
+        first_table_char = clip_obj(chars[np.flatnonzero(in_table)[0]], bbox)
+        table_chars.append({
+            **first_table_char,
+            "text": markdown
+        })
 
-        if "Редактор" in page_text:
-            page_text = page_text[: page_text.find("Редактор")].strip()
+    return [char for char, kept in zip(chars, keep) if kept] + table_chars
 
-        all_text.append(page_text)
 
-    pdf.close()
-    return "\n".join(all_text)
\ No newline at end of file
+def process_page(page) -> str | None:
+    """Текст страницы с таблицами в markdown; None — страница пропускается."""
+    page = page.crop(page.bbox)
+    page_text_full = page.extract_text()
+
+    # Игнорирование титульной страницы и содержания. 
+    if "Издание официальное" in (page_text_full or "") or 'Содержание' in (page_text_full or ""):
+        return None
+
+    tables = []
+    for table in page.find_tables():
+        table_data = table.extract()
+        table_data = [[cell if cell is not None else "" for cell in row] for row in table_data]
+
+        df = pd.DataFrame(table_data)
+        if len(df) == 0:
+            continue
+
+        df.columns = df.iloc[0]
+        tables.append((table.bbox, df.drop(0).to_markdown(index=False)))
+
+    chars = replace_table_chars(page.chars, tables)
+
+    page_text = extract_text(chars, layout=True)
+
+    if "Библиография" in page_text:
+        page_text = page_text[: page_text.find("Библиография")].strip()
+
+    if "Редактор" in page_text:
+        page_text = page_text[: page_text.find("Редактор")].strip()
+
+    return page_text
+
+
+def extract_pages(pdf_path, pages: range | None = None, pdf_hash: str | None = None) -> list[str]:
+    """Извлечение текста (с таблицами в markdown) постранично.
+
+    pages — диапазон индексов страниц, по умолчанию весь документ.
+    Результаты страниц кэшируются на диске по sha256 документа, поэтому при
+    повторном запуске pdfplumber вызывается только для новых страниц.
+    pdf_hash — уже посчитанный sha256, чтобы задачи по диапазонам страниц
+    не читали и не хэшировали файл заново.
+    """
+    if not settings.EXTRACTION_CACHE_ENABLED:
+        with pdfplumber.open(pdf_path) as pdf:
+            selected = pdf.pages if pages is None else [pdf.pages[i] for i in pages]
+            texts = [process_page(page) for page in selected]
+        return [text for text in texts if text is not None]
+
+    cache = get_extraction_cache()
+    pdf_hash = pdf_hash or file_hash(pdf_path)
+
+    page_count = cache.get_page_count(pdf_hash, EXTRACTOR_VERSION)
+    indices = pages if pages is not None else (range(page_count) if page_count is not None else None)
+    cached = cache.get_many(pdf_hash, indices, EXTRACTOR_VERSION) if indices is not None else {}
+
+    if indices is None or len(cached) < len(indices):
+        new = {}
+        with pdfplumber.open(pdf_path) as pdf:
+            page_count = len(pdf.pages)
+            if indices is None:
+                indices = range(page_count)
+            for i in indices:
+                if i not in cached:
+                    new[i] = process_page(pdf.pages[i])
+        cache.put_many(pdf_hash, new, EXTRACTOR_VERSION, page_count=page_count)
+        cached.update(new)
+
+    return [cached[i] for i in indices if cached[i] is not None]
+
+
+def process_pdf(pdf_path, pages: range | None = None) -> str:
+    return "\n".join(extract_pages(pdf_path, pages))
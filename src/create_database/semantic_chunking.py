@@ -1,60 +1,139 @@
 # Поправка!
 # Здесь я был вынужден скачивать и использовать локальные версии токенайзера и модели, т.к.
 # по невыясненной причине они не загружались из hf. Вы можете заменить их на закомментированные версии
+from functools import lru_cache
+
 from langchain_core.documents import Document
-from transformers import AutoTokenizer, pipeline
 import numpy as np
 from tqdm import tqdm
 
-# tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-tokenizer = AutoTokenizer.from_pretrained("model/tokenizer/tokenizer/")
+from src.config import settings
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """Токенайзер загружается при первом обращении, а не при импорте модуля."""
+    from transformers import AutoTokenizer
+
+    # return AutoTokenizer.from_pretrained("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    return AutoTokenizer.from_pretrained("model/tokenizer/tokenizer/")
+
+
+@lru_cache(maxsize=None)
+def get_nli_model():
+    """NLI pipeline загружается при первом обращении, а не при импорте модуля."""
+    from transformers import pipeline
 
+    # return pipeline(
+    #     "zero-shot-classification",
+    #     model="cointegrated/rubert-tiny2"
+    # )
+    return pipeline(
+        "zero-shot-classification",
+        model="model/nli_model/nli_model/"
+    )
 
-# nli_model = pipeline(
-#     "zero-shot-classification",
-#     model="cointegrated/rubert-tiny2"
-# )
-nli_model = pipeline(
-    "zero-shot-classification",
-    model="model/nli_model/nli_model/"
-)
 
 def count_tokens(text: str) -> int:
     """Подсчёт количества токенов в тексте."""
-    return len(tokenizer.encode(text))
+    return len(get_tokenizer().encode(text))
+
+
+def _content_tokens(chunk: Document) -> int:
+    """Число токенов чанка без служебных: из metadata['tokens'], если чанкер его посчитал."""
+    tokens = chunk.metadata.get('tokens')
+    if tokens is None:
+        tokens = len(get_tokenizer().encode(chunk.page_content, add_special_tokens=False))
+    return tokens
+
+
+CANDIDATE_LABELS = ['в одном предложении', 'в разных предложениях']
+
+
+def _is_same(output: dict) -> bool:
+    true_idx = output['labels'].index(CANDIDATE_LABELS[0])
+    return np.argmax(output['scores']) == true_idx
+
 
 def same_sentence(premise: Document, hypothesis: Document, zero_shot_classifier) -> bool:
     """Проверка, относятся ли premise и hypothesis к одному предложению."""
     input_text = f"{premise.page_content}\n\n{hypothesis.page_content}"
-    candidate_labels = ['в одном предложении', 'в разных предложениях']
-    output = zero_shot_classifier(input_text, candidate_labels, multi_label=False)
-    true_idx = output['labels'].index('в одном предложении')
-    pred = np.argmax(output['scores']) == true_idx
-    return pred
-
-def merge_docs(chunks: list[Document], nli_model = nli_model) -> list[Document]:
-    """Объединение чанков, которые относятся к одному предложению."""
+    output = zero_shot_classifier(input_text, CANDIDATE_LABELS, multi_label=False)
+    return _is_same(output)
+
+
+def same_sentence_batch(chunks: list[Document], zero_shot_classifier, batch_size: int) -> list[bool]:
+    """Оценка всех соседних границ (chunks[i-1], chunks[i]) пачками.
+
+    Пары подаются в pipeline списком, и он прогоняет их батчами по batch_size
+    с паддингом вместо отдельного forward pass на каждую пару.
+    Элемент i результата относится к границе между chunks[i] и chunks[i + 1].
+    """
+    inputs = [
+        f"{premise.page_content}\n\n{hypothesis.page_content}"
+        for premise, hypothesis in zip(chunks, chunks[1:])
+    ]
+    if not inputs:
+        return []
+    outputs = zero_shot_classifier(inputs, CANDIDATE_LABELS, multi_label=False, batch_size=batch_size)
+    return [_is_same(output) for output in outputs]
+
+
+def merge_docs(chunks: list[Document], nli_model = None, batch_size: int | None = None,
+               max_tokens: int | None = None) -> list[Document]:
+    """Объединение чанков, которые относятся к одному предложению.
+
+    По умолчанию каждая пара (накопленный premise, следующий чанк) проверяется
+    отдельным вызовом модели. При заданном batch_size все соседние границы
+    исходных чанков оцениваются заранее батчами; готовая оценка используется,
+    когда premise — сам предыдущий исходный чанк. После объединения premise
+    уже другой текст, и такая пара оценивается отдельным вызовом, поэтому
+    результат совпадает с последовательным режимом.
+
+    Объединённый чанк не длиннее max_tokens токенов вместе со служебными
+    (по умолчанию — окно модели эмбеддингов settings.EMBEDDING_MAX_TOKENS).
+    """
     if not chunks:
         return []
 
+    nli_model = nli_model or get_nli_model()
+    max_tokens = max_tokens or settings.EMBEDDING_MAX_TOKENS
+    if batch_size:
+        boundaries = same_sentence_batch(chunks, nli_model, batch_size)
+        is_same = lambda i, premise, hypothesis: (
+            boundaries[i - 1] if premise is chunks[i - 1] else same_sentence(premise, hypothesis, nli_model)
+        )
+    else:
+        is_same = lambda i, premise, hypothesis: same_sentence(premise, hypothesis, nli_model)
+
+    # Длина объединённого чанка ведётся инкрементально (сумма длин частей),
+    # а не перекодированием растущего текста на каждом шаге.
+    special_tokens = get_tokenizer().num_special_tokens_to_add()
+
     merged_chunks = []
     premise = chunks[0]
+    premise_tokens = _content_tokens(premise)
 
     def _add_chunk(chunk: Document):
         merged_chunks.append(chunk)
 
     for i in tqdm(range(1, len(chunks))):
         hypothesis = chunks[i]
-        if same_sentence(premise, hypothesis, nli_model):
-            premise_candidate = premise.page_content + ' ' + hypothesis.page_content
-            if count_tokens(premise_candidate) > 500:
+        hypothesis_tokens = _content_tokens(hypothesis)
+        if is_same(i, premise, hypothesis):
+            candidate_tokens = premise_tokens + hypothesis_tokens
+            if candidate_tokens + special_tokens > max_tokens:
                 _add_chunk(premise)
-                premise = hypothesis
+                premise, premise_tokens = hypothesis, hypothesis_tokens
             else:
-                premise = Document(page_content=premise_candidate, metadata=premise.metadata)
+                premise = Document(
+                    page_content=premise.page_content + ' ' + hypothesis.page_content,
+                    metadata={**premise.metadata, 'tokens': candidate_tokens},
+                )
+                premise_tokens = candidate_tokens
         else:
             _add_chunk(premise)
-            premise = hypothesis
+            premise, premise_tokens = hypothesis, hypothesis_tokens
 
     _add_chunk(premise)
-    return merged_chunks
\ No newline at end of file
+    return merged_chunks
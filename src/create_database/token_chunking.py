@@ -0,0 +1,67 @@
+SENTENCE_END = '.!?;:'
+
+
+def _has_gap(offsets: list[tuple[int, int]], i: int) -> bool:
+    """Есть ли пробельный разрыв перед токеном i (токен начинает новое слово)."""
+    return offsets[i][0] > offsets[i - 1][1]
+
+
+def _is_sentence_start(text: str, offsets: list[tuple[int, int]], i: int) -> bool:
+    prev_end = offsets[i - 1][1]
+    gap = text[prev_end:offsets[i][0]]
+    return bool(gap) and ('\n' in gap or text[prev_end - 1] in SENTENCE_END)
+
+
+def cut_point(text: str, offsets: list[tuple[int, int]], start: int, end: int) -> int:
+    """Индекс токена для конца фрагмента: граница предложения, иначе граница слова.
+
+    Граница ищется во второй половине окна [start, end), чтобы фрагменты не мельчали.
+    """
+    lower = start + (end - start) // 2
+    for i in range(end, lower, -1):
+        if _is_sentence_start(text, offsets, i):
+            return i
+    for i in range(end, lower, -1):
+        if _has_gap(offsets, i):
+            return i
+    return end
+
+
+def _word_start(offsets: list[tuple[int, int]], i: int, lower: int) -> int:
+    """Сдвиг начала перекрытия назад к началу слова."""
+    while i > lower and not _has_gap(offsets, i):
+        i -= 1
+    return i
+
+
+def split_by_tokens(text: str, tokenizer, chunk_size: int, chunk_overlap: int) -> list[tuple[str, int]]:
+    """Разбиение текста на перекрывающиеся фрагменты не длиннее chunk_size токенов.
+
+    Текст токенизируется один раз (нужен fast-токенайзер с offset mapping),
+    фрагменты режутся по границам предложений или слов, хвост документа не теряется.
+    Возвращает пары (текст фрагмента, число токенов без служебных).
+    """
+    if not tokenizer.is_fast:
+        raise ValueError('Для разбиения по токенам нужен fast-токенайзер')
+
+    offsets = tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True, verbose=False,
+    )['offset_mapping']
+
+    chunks = []
+    start, n_tokens = 0, len(offsets)
+
+    while start < n_tokens:
+        end = min(start + chunk_size, n_tokens)
+        if end < n_tokens:
+            end = cut_point(text, offsets, start, end)
+
+        chunk = text[offsets[start][0]:offsets[end - 1][1]].strip()
+        if chunk:
+            chunks.append((chunk, end - start))
+
+        if end >= n_tokens:
+            break
+        start = max(_word_start(offsets, end - chunk_overlap, start + 1), start + 1)
+
+    return chunks
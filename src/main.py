@@ -1,19 +1,34 @@
 # uvicorn src.main:app --port 8000 --host 0.0.0.0
 # asynccontextmanager - создание асинхронных контекстных менеджеров. 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 from src.api.router import router as api_router
 from src.client.chroma_db import chroma_database
+from src.client.context_packing import get_tokenizer
+from src.client.llm_registry import llm_registry
+from src.metrics import metrics
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await chroma_database.init()
+    await llm_registry.init()
+    # Токенайзер упаковки контекста загружается до первого запроса и вне event loop.
+    await asyncio.get_running_loop().run_in_executor(None, get_tokenizer)
     app.include_router(api_router, prefix="/api", tags=["API"])
     yield
+    await llm_registry.close()
     await chroma_database.close()
 
 
 app = FastAPI(lifespan=lifespan)
+
+
+@app.get('/metrics', include_in_schema=False)
+async def prometheus_metrics():
+    """Гистограммы стадий запроса в текстовом формате Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,158 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import AsyncIterator
+
+from src.config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in (*labels, *extra)]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин, отдельно по набору меток."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики корзин (последняя — +Inf), сумма, количество]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._series: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple, value: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        return [f'{self.name}{_format_labels(labels)} {value}' for labels, value in sorted(self._series.items())]
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 'labels', 'start')
+
+    def __init__(self, metrics: 'Metrics', stage: str, labels: tuple):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        labels = (('stage', self.stage), *self.labels)
+        with self.metrics.lock:
+            self.metrics.stage_seconds.observe(elapsed, labels)
+            if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+                self.metrics.stage_errors.inc(labels)
+        return False
+
+
+class Metrics:
+    """Тайминги стадий запроса RAG и их агрегаты в формате Prometheus.
+
+    При enabled=False (или для стадий из disabled_stages) span() возвращает
+    пустой контекстный менеджер и замеры ничего не стоят.
+    """
+
+    def __init__(self, enabled: bool = True, disabled_stages: list[str] = ()):
+        self.enabled = enabled
+        self.disabled_stages = set(disabled_stages)
+        self.lock = threading.Lock()
+        self.stage_seconds = Histogram('rag_stage_seconds', 'Длительность стадии запроса, с')
+        self.stage_errors = Counter('rag_stage_errors_total', 'Стадии, завершившиеся исключением')
+        self.llm_ttft = Histogram('rag_llm_ttft_seconds', 'Время до первого токена LLM, с')
+        self.llm_stream = Histogram('rag_llm_stream_seconds', 'Полное время потока LLM, с')
+        self.llm_rate = Histogram('rag_llm_tokens_per_second', 'Скорость потока LLM после первого токена', RATE_BUCKETS)
+        self._families = [self.stage_seconds, self.stage_errors, self.llm_ttft, self.llm_stream, self.llm_rate]
+
+    def active(self, stage: str) -> bool:
+        return self.enabled and stage not in self.disabled_stages
+
+    def span(self, stage: str, **labels):
+        """Контекстный менеджер, замеряющий стадию в rag_stage_seconds{stage=...}."""
+        if not self.active(stage):
+            return nullcontext()
+        return _Span(self, stage, tuple(sorted(labels.items())))
+
+    def timed_stream(self, stream: AsyncIterator[str], **labels) -> AsyncIterator[str]:
+        """Поток LLM с замером TTFT, полного времени и скорости (фрагмент потока считается токеном)."""
+        if not self.active('llm'):
+            return stream
+        return self._timed_stream(stream, tuple(sorted(labels.items())))
+
+    async def _timed_stream(self, stream: AsyncIterator[str], labels: tuple) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        first = None
+        tokens = 0
+        try:
+            async for chunk in stream:
+                if first is None:
+                    first = time.perf_counter()
+                    with self.lock:
+                        self.llm_ttft.observe(first - start, labels)
+                tokens += 1
+                yield chunk
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.llm_stream.observe(end - start, labels)
+                if tokens > 1 and end > first:
+                    self.llm_rate.observe((tokens - 1) / (end - first), labels)
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        with self.lock:
+            for family in self._families:
+                lines.append(f'# HELP {family.name} {family.help}')
+                lines.append(f'# TYPE {family.name} {family.kind}')
+                lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics(settings.METRICS_ENABLED, settings.METRICS_DISABLED_STAGES)
+
+
+def get_metrics() -> Metrics:
+    return metrics
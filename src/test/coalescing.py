@@ -0,0 +1,122 @@
+# python -m src.test.coalescing
+# Проверка объединения одинаковых одновременных запросов: на пачку параллельных
+# /ask и /ask_with_ai должен приходиться один поиск и один поток LLM,
+# а подключившийся позже клиент — получать ответ целиком.
+import asyncio
+import sys
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.documents import Document
+
+from benchmarks.fakes import offline_tokenizer
+from src.api.router import router
+from src.client import context_packing
+from src.client.cache import AnswerCache, get_answer_cache
+from src.client.chroma_db import get_chroma_database
+from src.client.coalescing import SingleFlight, StreamCoalescer, get_answer_streams, get_search_flight
+from src.client.llm_registry import get_llm_registry
+
+TOKENS = ['Массовая ', 'доля ', 'белка ', '— ', 'не менее ', '18 %.']
+
+
+class FakeDatabase:
+    # Упаковка контекста идёт в пуле потоков по умолчанию.
+    executor = None
+
+    def __init__(self):
+        self.calls = 0
+
+    async def search_document(self, query, filter=None, with_score=True, k=3):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return [(Document(page_content='Массовая доля белка не менее 18 %.', metadata={'source': 'a.pdf', 'chunk': 0}), 0.1)]
+
+    def stats(self) -> dict:
+        return {}
+
+
+class FakeChat:
+    def __init__(self):
+        self.calls = 0
+        self.first_token = asyncio.Event()
+
+    async def astream_response(self, formatted_context, query):
+        self.calls += 1
+        for token in TOKENS:
+            await asyncio.sleep(0.02)
+            self.first_token.set()
+            yield token
+
+
+class FakeRegistry:
+    def __init__(self, chat: FakeChat):
+        self.chat = chat
+
+    def get(self, provider):
+        return self.chat
+
+
+async def run(concurrency: int) -> list[str]:
+    database, chat = FakeDatabase(), FakeChat()
+    search_flight, answer_streams = SingleFlight(), StreamCoalescer()
+    answer_cache = AnswerCache(max_size=100, ttl=60)
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides.update({
+        get_chroma_database: lambda: database,
+        get_llm_registry: lambda: FakeRegistry(chat),
+        get_search_flight: lambda: search_flight,
+        get_answer_streams: lambda: answer_streams,
+        get_answer_cache: lambda: answer_cache,
+    })
+
+    errors = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        # Вопрос приходит в разном написании: ключ — нормализованный запрос.
+        payloads = [
+            {'response': query, 'category': 'мясные продукты'}
+            for query in ['Массовая доля белка', '  массовая ДОЛЯ белка '] * (concurrency // 2)
+        ]
+
+        responses = await asyncio.gather(*(client.post('/ask', json=p) for p in payloads))
+        if database.calls != 1:
+            errors.append(f'/ask: {database.calls} поисков на {len(payloads)} запросов')
+        if len({r.text for r in responses}) != 1:
+            errors.append('/ask: разные ответы на одинаковые запросы')
+
+        database.calls = 0
+        first = [asyncio.create_task(client.post('/ask_with_ai', json=p)) for p in payloads]
+        # Опоздавшие подключаются, когда поток уже начался.
+        await chat.first_token.wait()
+        late = [asyncio.create_task(client.post('/ask_with_ai', json=p)) for p in payloads[:2]]
+        responses = await asyncio.gather(*first, *late)
+
+        if chat.calls != 1:
+            errors.append(f'/ask_with_ai: {chat.calls} потоков LLM на {len(responses)} запросов')
+        # Опоздавшие приходят после завершения первого поиска: по одному поиску на волну.
+        if database.calls != 2:
+            errors.append(f'/ask_with_ai: {database.calls} поисков на две волны запросов')
+        if any(r.text != ''.join(TOKENS) for r in responses):
+            errors.append('/ask_with_ai: ответ отличается от потока LLM')
+
+    print(f'search: {search_flight.stats()}, answer_streams: {answer_streams.stats()}')
+    return errors
+
+
+def main() -> int:
+    # Упаковке контекста нужен токенайзер; локальная модель не требуется.
+    tokenizer = offline_tokenizer()
+    with mock.patch.object(context_packing, 'get_tokenizer', lambda: tokenizer):
+        errors = asyncio.run(run(concurrency=20))
+    for error in errors:
+        print(error)
+    print('OK' if not errors else 'ОШИБКА')
+    return int(bool(errors))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,43 @@
-# python -m src.test.evaluate
-import torch
+# python -m src.test.evaluate [--provider deepseek] [--concurrency 4] [--output scores.csv]
+import argparse
 import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from functools import lru_cache
 from datasets import Dataset
 from ragas import evaluate
 from ragas.metrics import faithfulness, answer_relevancy, answer_correctness, context_precision
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document
 from langchain_deepseek import ChatDeepSeek
 
 from src.config import settings
-from src.client.ai_chat import ChatWithAI
+from src.client.ai_chat import ERROR_MESSAGE, SYSTEM_PROMPT
 from src.client.chroma_db import get_chroma_database
+from src.client.context_packing import pack_blocks
+from src.client.embeddings import create_embeddings
+from src.client.llm_registry import get_llm_registry
+from src.create_database.manifest import index_version
 
 
-critic_llm = LangchainLLMWrapper(ChatDeepSeek(
-    api_key=settings.DEEPSEEK_API,
-    model=settings.DEEPSEEK,
-))
+@lru_cache(maxsize=None)
+def get_critic_llm():
+    return LangchainLLMWrapper(ChatDeepSeek(
+        api_key=settings.DEEPSEEK_API,
+        model=settings.DEEPSEEK,
+    ))
 
-embeddings = LangchainEmbeddingsWrapper(HuggingFaceEmbeddings(
-    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-    model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"},
-    encode_kwargs={"normalize_embeddings": True},
-))
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    return LangchainEmbeddingsWrapper(create_embeddings())
+
+# Хэш системного промпта: при его изменении ответы генерируются заново.
+PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:16]
 
 questions = [
     {
@@ -71,31 +85,136 @@ ground_truths = [
     "В 1000 см3 дистиллированной воды растворяют при нагревании 10 г пептона, 3 г хлористого на­трия, 0.2 г фосфорнокислого деузамещенного натрия (дигидрофосфат). 15 г микробиологического ага­ра. 5.5 г мясного экстракта. При отсутствии мясного экстракта используют мясную воду (11.4.36). приэтом все компоненты растворяют в 1000 см3 мясной воды. Устанавливают pH (7,610.1) ед. pH. Стери­лизуют в течение 30 мин при температуре (121 ± 1)С. охлаждают до температуры (50—60) *С. добав­ляют 0,15 г азида натрия, смешивают, вновь стерилизуют в течение 30 мин при температуре (121 ♦ 1) *С. После охлаждения до температуры (5011) вС добавляют 150 см3 желточной эмульсии (11.4.23). смешивают и разливают в чашки Петри. Срок хранения — не более 5 сут при температуре (411) *С"
 ]
 
-async def run_evaluation():
+class EvaluationCache:
+    """Кэш прогонов оценки (SQLite): результаты поиска и ответы по вопросам.
+
+    Ключ результатов поиска — версия индекса, режим поиска (SEARCH_MODE и
+    LEXICAL_CANDIDATES), вопрос, категория и k; ключ ответа — хэш системного
+    промпта, провайдер, вопрос и сам контекст, переданный LLM. При смене
+    только метрик поиск и генерация не повторяются.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS search_results (key TEXT PRIMARY KEY, results TEXT NOT NULL, latency_ms REAL);'
+            'CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, latency_ms REAL);'
+        )
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256('\0'.join(map(str, parts)).encode('utf-8')).hexdigest()
+
+    def get_retrieval(self, key: str) -> tuple[list[tuple[Document, float]], float] | None:
+        row = self._conn.execute('SELECT results, latency_ms FROM search_results WHERE key = ?', (key,)).fetchone()
+        if not row:
+            return None
+        results = [(Document(page_content=text, metadata=metadata), score) for text, metadata, score in json.loads(row[0])]
+        return results, row[1]
+
+    def put_retrieval(self, key: str, results: list[tuple[Document, float]], latency_ms: float):
+        stored = [(doc.page_content, doc.metadata, score) for doc, score in results]
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO search_results VALUES (?, ?, ?)',
+                (key, json.dumps(stored, ensure_ascii=False), latency_ms),
+            )
+
+    def get_answer(self, key: str) -> tuple[str, float] | None:
+        row = self._conn.execute('SELECT answer, latency_ms FROM answers WHERE key = ?', (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_answer(self, key: str, answer: str, latency_ms: float):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO answers VALUES (?, ?, ?)', (key, answer, latency_ms))
+
+    def close(self):
+        self._conn.close()
+
+
+async def answer_question(item: dict, vectorstore, ai_store, cache: EvaluationCache,
+                          version: str, semaphore: asyncio.Semaphore, k: int = 5) -> dict:
+    """Поиск и генерация ответа на один вопрос (или их результаты из кэша) с замером задержек."""
+    query, category = item["question"], item.get("category")
+    async with semaphore:
+        # Без лексического индекса гибридный режим фактически векторный.
+        search_mode = settings.SEARCH_MODE if vectorstore.lexical is not None else 'dense'
+        retrieval_key = cache.key(version, search_mode, settings.LEXICAL_CANDIDATES, query, category, k)
+        cached = cache.get_retrieval(retrieval_key)
+        cached_retrieval = cached is not None
+        if cached_retrieval:
+            results, retrieval_ms = cached
+        else:
+            start = time.perf_counter()
+            filter = {'category': category} if category else None
+            results = await vectorstore.search_document(query=query, filter=filter, with_score=True, k=k)
+            retrieval_ms = (time.perf_counter() - start) * 1000
+            cache.put_retrieval(retrieval_key, results, retrieval_ms)
+
+        # Контекст собирается так же, как в /ask_with_ai; ragas оценивает именно его блоки.
+        contexts = await asyncio.get_running_loop().run_in_executor(
+            None, pack_blocks, results, settings.CONTEXT_MAX_TOKENS, settings.CONTEXT_MIN_SIMILARITY,
+        )
+        ai_context = "\n".join(contexts)
+        answer_key = cache.key(PROMPT_HASH, ai_store.provider, query, cache.key(ai_context))
+        cached = cache.get_answer(answer_key)
+        cached_answer = cached is not None
+        if cached_answer:
+            answer, generation_ms = cached
+        elif not ai_context:
+            # Как и /ask_with_ai, без подходящих фрагментов LLM не вызывается.
+            answer, generation_ms = "Ничего не найдено", 0.0
+        else:
+            start = time.perf_counter()
+            response_chunks = []
+            async for chunk in ai_store.astream_response(ai_context, query):
+                response_chunks.append(chunk)
+            generation_ms = (time.perf_counter() - start) * 1000
+            answer = ''.join(response_chunks)
+            # Ответы с ошибкой провайдера не кэшируются.
+            if response_chunks and response_chunks[-1] != ERROR_MESSAGE:
+                cache.put_answer(answer_key, answer, generation_ms)
+
+    print(f"Вопрос: {query}\nОтвет: {answer}\n")
+    return {
+        "question": query,
+        "answer": answer,
+        "contexts": contexts,
+        "retrieval_ms": round(retrieval_ms, 1),
+        "generation_ms": round(generation_ms, 1),
+        "cached_retrieval": cached_retrieval,
+        "cached_answer": cached_answer,
+    }
+
+
+async def run_evaluation(provider: str = 'deepseek', concurrency: int | None = None, output: str | None = None):
     vectorstore = get_chroma_database()
-    if vectorstore.store is None:
+    if not vectorstore.initialized:
         await vectorstore.init()
+    llm_registry = get_llm_registry()
+    if not llm_registry.clients:
+        await llm_registry.init()
+    ai_store = llm_registry.get(provider)
 
-    results = []
-    for i, item in enumerate(questions):
-        query = item["question"] 
-        result = await vectorstore.search_document(query=query, with_score=True, k=5)
-        contexts = [doc.page_content for doc, _ in result]
-        ai_context = "\n".join(contexts)
+    cache = EvaluationCache(settings.EVAL_CACHE_PATH)
+    version = index_version()
+    semaphore = asyncio.Semaphore(concurrency or settings.EVAL_CONCURRENCY)
+    try:
+        results = await asyncio.gather(*(
+            answer_question(item, vectorstore, ai_store, cache, version, semaphore) for item in questions
+        ))
+    finally:
+        cache.close()
 
-        ai_store = ChatWithAI() 
-        response_chunks = []
-        async for chunk in ai_store.astream_response(ai_context, query):  
-            response_chunks.append(chunk)
-        answer = ''.join(response_chunks)
-        print(f"Вопрос: {query}\nОтвет: {answer}\n")
+    for result, reference in zip(results, ground_truths):
+        result["reference"] = reference
 
-        results.append({
-            "question": query,  
-            "answer": answer,
-            "contexts": contexts,
-            "reference": ground_truths[i] 
-        })
+    print(
+        f"Индекс {version}, промпт {PROMPT_HASH}: из кэша "
+        f"{sum(r['cached_retrieval'] for r in results)} контекстов и "
+        f"{sum(r['cached_answer'] for r in results)} ответов из {len(results)}"
+    )
 
     dataset = Dataset.from_dict({
         "question": [r["question"] for r in results],
@@ -114,12 +233,26 @@ async def run_evaluation():
     scores = evaluate(
         dataset,
         metrics=metrics,
-        llm=critic_llm,
-        embeddings=embeddings,
+        llm=get_critic_llm(),
+        embeddings=get_embeddings(),
     )
     print(scores)
+
+    # Оценки по вопросам вместе с задержками поиска и генерации.
+    per_question = scores.to_pandas()
+    for column in ("retrieval_ms", "generation_ms", "cached_retrieval", "cached_answer"):
+        per_question[column] = [r[column] for r in results]
+    print(per_question.drop(columns=["contexts", "reference"], errors="ignore").to_string())
+    if output:
+        per_question.to_csv(output, index=False)
     return scores
 
 
 if __name__ == "__main__":
-    asyncio.run(run_evaluation())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Оценка ответов RAG с помощью ragas")
+    parser.add_argument('--provider', choices=['deepseek', 'gigachat'], default='deepseek')
+    parser.add_argument('--concurrency', type=int, help="Одновременных вопросов (по умолчанию EVAL_CONCURRENCY)")
+    parser.add_argument('--output', help="CSV с оценками и задержками по вопросам")
+    args = parser.parse_args()
+
+    asyncio.run(run_evaluation(args.provider, args.concurrency, args.output))
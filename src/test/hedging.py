@@ -0,0 +1,177 @@
+# python -m src.test.hedging
+# Проверка хеджирования потока LLM (HedgedChat) на фиктивных провайдерах с заданными
+# задержками: кто отдаёт ответ, отменяется ли проигравший поток и каково время
+# до первого токена для быстрого и медленного основного провайдера, ошибки до
+# первого токена, отказа обоих провайдеров и ошибки посреди потока; ответ,
+# отданный запасным провайдером, не кэшируется в /ask_with_ai как ответ основного.
+import asyncio
+import sys
+import time
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.fakes import offline_tokenizer
+from src.api.router import router
+from src.client import context_packing
+from src.client.ai_chat import ERROR_MESSAGE
+from src.client.cache import AnswerCache, context_fingerprint, get_answer_cache
+from src.client.chroma_db import get_chroma_database
+from src.client.hedging import HedgedChat
+from src.client.llm_registry import get_llm_registry
+from src.test.coalescing import FakeDatabase
+
+DEADLINE = 0.1
+# Допуск на планировщик event loop при сравнении времени.
+SLACK = 0.05
+
+
+class FakeProvider:
+    """Провайдер с первым токеном через ttft секунд; fail_at — номер токена, на котором поток падает."""
+
+    def __init__(self, provider: str, ttft: float, tokens: int = 3, interval: float = 0.01,
+                 fail_at: int | None = None):
+        self.provider = provider
+        self.ttft = ttft
+        self.tokens = tokens
+        self.interval = interval
+        self.fail_at = fail_at
+        self.started = False
+        self.cancelled = False
+
+    async def astream(self, formatted_context: str, query: str):
+        self.started = True
+        try:
+            await asyncio.sleep(self.ttft)
+            for i in range(self.tokens):
+                if i == self.fail_at:
+                    raise RuntimeError(f'{self.provider}: обрыв соединения')
+                if i:
+                    await asyncio.sleep(self.interval)
+                yield f'{self.provider}{i} '
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def tokens(provider: str, n: int = 3) -> list[str]:
+    return [f'{provider}{i} ' for i in range(n)]
+
+
+async def run(primary: FakeProvider, secondary: FakeProvider) -> tuple[list[str], float, str | None]:
+    """Ответ целиком, время до первого фрагмента и провайдер, давший ответ."""
+    chat = HedgedChat(primary, secondary, DEADLINE)
+    start = time.perf_counter()
+    ttft, chunks = None, []
+    async for chunk in chat.astream_response('контекст', 'вопрос'):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        chunks.append(chunk)
+    # Отменённые задачи завершаются на следующих итерациях event loop.
+    await asyncio.sleep(0.01)
+    return chunks, ttft, chat.answered_by
+
+
+class HedgedRegistry:
+    """Как LLMRegistry.get: новый HedgedChat на каждый запрос."""
+
+    def __init__(self, primary_ttft: float):
+        self.primary_ttft = primary_ttft
+
+    def get(self, provider):
+        return HedgedChat(FakeProvider('deepseek', self.primary_ttft), FakeProvider('gigachat', 0.01), DEADLINE)
+
+
+async def check_answer_cache(expect):
+    """Ответ запасного кэшируется под его провайдером, а не под запрошенным."""
+    database, answer_cache = FakeDatabase(), AnswerCache(max_size=10, ttl=60)
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides.update({
+        get_chroma_database: lambda: database,
+        get_llm_registry: lambda: HedgedRegistry(primary_ttft=1.0),
+        get_answer_cache: lambda: answer_cache,
+    })
+
+    payload = {'response': 'Массовая доля белка', 'category': 'мясные продукты', 'provider': 'deepseek'}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        response = await client.post('/ask_with_ai', json=payload)
+
+    fingerprint = context_fingerprint(await database.search_document(payload['response']))
+    key = lambda provider: answer_cache.key(payload['response'], payload['category'], provider, fingerprint)
+    expect('кэш ответов: ответ запасного', response.text == ''.join(tokens('gigachat')), response.text)
+    expect('кэш ответов: не сохранён как ответ основного', answer_cache.get(key('deepseek')) is None)
+    expect('кэш ответов: сохранён под запасным', answer_cache.get(key('gigachat')) == tokens('gigachat'))
+
+
+async def check() -> list[str]:
+    errors = []
+
+    def expect(name: str, condition: bool, detail: str = ''):
+        print(f"{'OK' if condition else 'ОШИБКА'}  {name}{f': {detail}' if detail and not condition else ''}")
+        if not condition:
+            errors.append(f'{name}: {detail}')
+
+    # Быстрый основной: запасной не запускается.
+    primary, secondary = FakeProvider('deepseek', 0.02), FakeProvider('gigachat', 0.02)
+    chunks, ttft, answered_by = await run(primary, secondary)
+    expect('быстрый основной: ответ основного', chunks == tokens('deepseek'), str(chunks))
+    expect('быстрый основной: answered_by', answered_by == 'deepseek', str(answered_by))
+    expect('быстрый основной: запасной не запущен', not secondary.started)
+    expect('быстрый основной: TTFT', ttft < 0.02 + SLACK, f'{ttft:.3f} с')
+
+    # Медленный основной: после дедлайна отвечает запасной, основной отменяется.
+    primary, secondary = FakeProvider('deepseek', 1.0), FakeProvider('gigachat', 0.03)
+    chunks, ttft, answered_by = await run(primary, secondary)
+    expect('медленный основной: ответ запасного', chunks == tokens('gigachat'), str(chunks))
+    expect('медленный основной: answered_by', answered_by == 'gigachat', str(answered_by))
+    expect('медленный основной: основной отменён', primary.cancelled)
+    expect('медленный основной: TTFT', DEADLINE + 0.03 <= ttft < DEADLINE + 0.03 + SLACK, f'{ttft:.3f} с')
+
+    # Основной отвечает после дедлайна, но раньше запасного: запасной отменяется.
+    primary, secondary = FakeProvider('deepseek', DEADLINE + 0.03), FakeProvider('gigachat', 1.0)
+    chunks, ttft, answered_by = await run(primary, secondary)
+    expect('основной после дедлайна: ответ основного', chunks == tokens('deepseek'), str(chunks))
+    expect('основной после дедлайна: запасной запущен и отменён', secondary.started and secondary.cancelled)
+    expect('основной после дедлайна: TTFT', ttft < DEADLINE + 0.03 + SLACK, f'{ttft:.3f} с')
+
+    # Ошибка до первого токена: запасной запускается сразу, не дожидаясь дедлайна.
+    primary = FakeProvider('deepseek', 0.01, fail_at=0)
+    secondary = FakeProvider('gigachat', 0.03)
+    chunks, ttft, answered_by = await run(primary, secondary)
+    expect('ошибка до первого токена: ответ запасного', chunks == tokens('gigachat'), str(chunks))
+    expect('ошибка до первого токена: TTFT до дедлайна', ttft < DEADLINE, f'{ttft:.3f} с')
+
+    # Оба провайдера падают: пользователь получает сообщение об ошибке.
+    primary = FakeProvider('deepseek', 0.01, fail_at=0)
+    secondary = FakeProvider('gigachat', 0.01, fail_at=0)
+    chunks, ttft, answered_by = await run(primary, secondary)
+    expect('отказ обоих: сообщение об ошибке', chunks == [ERROR_MESSAGE], str(chunks))
+    expect('отказ обоих: answered_by', answered_by is None, str(answered_by))
+
+    # Ошибка посреди потока: переключения нет, уже отданное не повторяется.
+    primary = FakeProvider('deepseek', 0.01, fail_at=2)
+    secondary = FakeProvider('gigachat', 0.01)
+    chunks, ttft, answered_by = await run(primary, secondary)
+    expect('ошибка посреди потока: начало ответа и ошибка', chunks == [*tokens('deepseek', 2), ERROR_MESSAGE],
+           str(chunks))
+    expect('ошибка посреди потока: запасной не запущен', not secondary.started)
+
+    await check_answer_cache(expect)
+
+    return errors
+
+
+def main() -> int:
+    # Упаковке контекста в /ask_with_ai нужен токенайзер; локальная модель не требуется.
+    tokenizer = offline_tokenizer()
+    with mock.patch.object(context_packing, 'get_tokenizer', lambda: tokenizer):
+        errors = asyncio.run(check())
+    print('OK' if not errors else 'ОШИБКА')
+    return int(bool(errors))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# python -m src.test.import_time
+# Проверка бюджета времени импорта точек входа (python -X importtime).
+import subprocess
+import sys
+
+# Модуль -> бюджет на импорт, секунды.
+BUDGETS = {
+    "src.config": 1.0,
+    "src.create_database.semantic_chunking": 1.5,
+    "src.main": 5.0,
+}
+
+# Модули, которые не должны загружаться при импорте.
+FORBIDDEN = {
+    "src.config": ["torch"],
+    "src.create_database.semantic_chunking": ["torch", "transformers"],
+}
+
+
+def measure_import(module: str) -> dict[str, int]:
+    """Кумулятивное время импорта (мкс) по каждому модулю, загруженному при импорте module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def main() -> int:
+    failed = False
+    for module, budget in BUDGETS.items():
+        timings = measure_import(module)
+        seconds = timings[module] / 1e6
+        status = "OK" if seconds <= budget else "ПРЕВЫШЕН"
+        print(f"{module}: {seconds:.2f} с (бюджет {budget:.2f} с) {status}")
+        failed |= seconds > budget
+
+        for name in FORBIDDEN.get(module, []):
+            if name in timings:
+                print(f"  {module} загружает {name} при импорте")
+                failed = True
+
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
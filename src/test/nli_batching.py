@@ -0,0 +1,75 @@
+# python -m src.test.nli_batching
+# Проверка, что merge_docs с батчевой оценкой границ (NLI_BATCH_SIZE) даёт те же
+# фрагменты, что и последовательный режим, на фиксированных документах.
+# Модель NLI и токенайзер — офлайн-заменители из benchmarks.fakes; заменитель NLI
+# учитывает длину накопленного premise, поэтому пары после объединения
+# оцениваются иначе, чем пары исходных чанков.
+import sys
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import FakeNLI, offline_models
+from src.create_database.semantic_chunking import merge_docs
+from src.create_database.token_chunking import split_by_tokens
+
+DOCUMENTS = [
+    'Раствор гидроокиси натрия концентрации 330 г/дм3 готовят растворением навески в дистиллированной '
+    'воде, количественно переносят в мерную колбу вместимостью 1000 см3 и доводят объем до метки. '
+    'Раствор хранят при температуре (20 ± 2) °С не более 1 мес. Массовая доля белка должна быть не менее '
+    '18 % и определяется по ГОСТ 25011 с погрешностью не более 0,5 %. Отбор проб проводят по ГОСТ 9792.',
+
+    'Для хранения проб, содержащих светочувствительные ингредиенты, включая морские водоросли, применяют '
+    'емкости из светонепроницаемого или неактиничного стекла с последующим размещением их в '
+    'светонепроницаемую упаковку на весь период хранения проб. Емкости с водой в транспортной упаковке '
+    'хранят в защищенном от солнечного света месте при температуре от 5 °С до 20 °С.',
+
+    'Навеску продукта массой 5 г помещают в коническую колбу вместимостью 250 см3, приливают 50 см3 '
+    'дистиллированной воды и перемешивают. Кислотность продукта рассчитывают по формуле, результаты '
+    'испытаний оформляют протоколом! Допускается применение других средств измерений с аналогичными '
+    'метрологическими характеристиками',
+]
+
+CHUNK_SIZE = 8
+PREMISE_LIMIT = 120
+BATCH_SIZE = 4
+
+
+def merge(chunks: list[Document], batch_size: int | None, premise_limit: int | None) -> tuple[list, FakeNLI]:
+    nli = FakeNLI(premise_limit=premise_limit)
+    merged = merge_docs(chunks, nli_model=nli, batch_size=batch_size)
+    return [(doc.page_content, doc.metadata.get('tokens')) for doc in merged], nli
+
+
+def main() -> int:
+    errors = []
+    with offline_models() as (tokenizer, _):
+        for n, text in enumerate(DOCUMENTS):
+            chunks = [
+                Document(page_content=chunk, metadata={'tokens': tokens})
+                for chunk, tokens in split_by_tokens(text, tokenizer, CHUNK_SIZE, 0)
+            ]
+            sequential, sequential_nli = merge(chunks, None, PREMISE_LIMIT)
+            batched, batched_nli = merge(chunks, BATCH_SIZE, PREMISE_LIMIT)
+            unlimited, _ = merge(chunks, None, None)
+
+            print(
+                f'документ {n}: {len(chunks)} чанков -> {len(sequential)}; forward pass: '
+                f'последовательно {sequential_nli.calls}, батчами {batched_nli.calls} '
+                f'({batched_nli.pairs} пар)'
+            )
+            if batched != sequential:
+                errors.append(f'документ {n}: батчевый режим дал другие фрагменты')
+            # Фикстура должна проверять именно пары после объединения.
+            if unlimited == sequential:
+                errors.append(f'документ {n}: длина premise ни на что не повлияла')
+            if batched_nli.pairs == len(chunks) - 1:
+                errors.append(f'документ {n}: ни одна пара после объединения не оценена отдельно')
+
+    print('OK' if not errors else 'ОШИБКА')
+    for error in errors:
+        print(error)
+    return int(bool(errors))
+
+
+if __name__ == "__main__":
+    sys.exit(main())